@@ -0,0 +1,109 @@
+"""documents, and the file format ed and nano share
+
+A document is a store of Lines (see line.py), and an appendix of hidden
+complete lines after them : ed keeps its buffer in one. nano keeps a
+line as its text, with its final newline, and a visibility mask (one
+byte per character, 1 if visible), and only goes through documents to
+read and write files (see Line.fromMask and Line.mask).
+
+Documents are saved as a magic line, then for each line its length
+and visibility runs on a line, followed by its text (with a final
+newline). The appendix, if any, is saved as a last, hidden, line.
+"""
+
+from line import Line
+
+# First line of saved documents
+MAGIC = "nohide 1\n"
+
+
+def runs(mask):
+    """alternating visible and hidden character counts of mask"""
+    counts = []
+    start = 0
+    shown = True
+    while start < len(mask):
+        end = mask.find(b"\x00" if shown else b"\x01", start)
+        if end == -1:
+            end = len(mask)
+        counts.append(end - start)
+        start = end
+        shown = not shown
+    return counts or [0]
+
+def fromRuns(counts):
+    """mask of alternating visible and hidden character counts"""
+    mask = bytearray()
+    for n, count in enumerate(counts):
+        mask += bytearray([n % 2 == 0]) * count
+    return mask
+
+def writeLines(f, lines):
+    """write (text, mask) pairs, after the magic line"""
+    f.write(MAGIC)
+    for text, mask in lines:
+        f.write("{} {}\n".format(len(text), " ".join(map(str, runs(mask)))))
+        f.write(text)
+
+def readLines(f):
+    """(text, mask) pairs written by writeLines"""
+    if f.readline() != MAGIC:
+        raise ValueError("not a nohide document")
+    for header in iter(f.readline, ""):
+        length, *counts = map(int, header.split())
+        yield f.read(length), fromRuns(counts)
+
+
+class Document:
+    """lines of text with their hidden parts, and hidden lines after them
+    lines is kept in store (see store.py), the appendix in a list."""
+
+    def __init__(self, lines=(), appendix=(), store=list):
+        self.store = store
+        self.lines = store(map(Line.fromParts, lines))
+        self.appendix = list(appendix)
+
+    def splice(self, start, stop, lines):
+        """replace lines [start, stop[ with lines (Lines or nested lists)"""
+        self.lines[start:stop] = list(map(Line.fromParts, lines))
+
+    def pairs(self):
+        """text (with final newline) and mask of each line"""
+        return [(line.text + "\n", line.mask() + b"\x01")
+                for line in self.lines]
+
+    def masks(self):
+        """pairs, with the appendix hidden at the end of the last line"""
+        lines = self.pairs()
+        if self.appendix:
+            hidden = "".join(self.appendix)
+            text, mask = lines.pop() if lines else ("\n", bytearray(b"\x01"))
+            lines.append((text[:-1] + hidden + "\n",
+                          mask[:-1] + bytes(len(hidden)) + b"\x01"))
+        return lines
+
+    @classmethod
+    def fromMasks(cls, lines, appendix=(), store=list):
+        """document of texts (with final newlines) and masks"""
+        doc = cls(store=store)
+        doc.lines = store(Line.fromMask(text[:-1], mask[:-1])
+                          for text, mask in lines)
+        doc.appendix = list(appendix)
+        return doc
+
+    def write(self, f):
+        lines = self.pairs()
+        if self.appendix:
+            hidden = "".join(self.appendix)
+            lines.append((hidden, bytes(len(hidden))))
+        writeLines(f, lines)
+
+    @classmethod
+    def read(cls, f, store=list):
+        lines = list(readLines(f))
+        appendix = []
+        if lines and not any(lines[-1][1]):
+            # hidden last line
+            appendix = [line + "\n"
+                        for line in lines.pop()[0].split("\n")[:-1]]
+        return cls.fromMasks(lines, appendix, store)
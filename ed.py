@@ -1,5 +1,17 @@
 import sys
+import os
 import re
+import shutil
+import io
+import itertools
+import collections
+from store import RopeStore, FileChunk, iterate
+from line import Line
+from marks import MarkIndex
+from journal import Journal
+from index import TrigramIndex
+from document import Document, MAGIC
+from stats import CommandStats
 
 help = """
 NOHIDE (ed mode) : a line editor which doesn't really delete
@@ -18,7 +30,12 @@ NOHIDE (ed mode) : a line editor which doesn't really delete
     d           delete (but not really) range (or current line)
     c           change
     /<regex>    go to first match (search forward)
+    H/<regex>   list matches in hidden content (line:part)
     g/re/<op>   apply op to all matching lines
+    e <fn>      edit file (soft quit current buffer)
+    w <fn>      write range (or text) to file
+    W <fn>      write text with hidden content to file (for e, or nano)
+    T           print time, lines and memory per command (ed -t)
     q           soft quit (twice to override)
     Q           hard quit
 
@@ -35,6 +52,7 @@ For example:
     ,a          append file
     2,-1d       delete from 2nd line to previous line
     s/old/new   substitute in line
+    s           repeat substitution (// and s// reuse the last pattern)
 
 To do:
 
@@ -42,8 +60,6 @@ To do:
     j           join range to single line (+ yank range)
     k<lc>       create mark (lowercase character)
     <arrows>    move inside line (maybe not), go through history
-    w <fn>      write to file
-    e <fn>      edit file (soft quit current buffer)
     G/re        ask for op, at every matching line
     v/re        apply op to all non-matching lines
     V/re        ask for op, at every non-matching line
@@ -54,13 +70,26 @@ To do:
 """
 
 
+# Write buffer size for w
+BLOCK = 1 << 20
+# Buffer size from which searches build a trigram index
+INDEXLINES = 1 << 12
+# Full scans after which it is built (building costs about as much)
+INDEXSCANS = 8
+# Compiled patterns and substitutions kept
+PATTERNS = 128
+
+
 def isDigit(c):
     return "0" <= c <= "9"
 
-def getText():
+def getText(readline=input):
     text = []
-    for line in sys.stdin:
-        line = line[:-1]
+    while True:
+        try:
+            line = readline()
+        except EOFError:
+            return text
         if line == ".":
             return text
         else:
@@ -78,36 +107,96 @@ def nsub(s, rng):
     # make iterator instead
     return [(n+rng[0], s[i]) for n, i in enumerate(range(rng[0], rng[-1]+1))]
 
-def visible(line):
-    vis = ""
-    for part in line:
-        if type(part) == type(""):
-            vis += part
-    return vis
-
-def complete(line):
-    s = ""
-    if type(line[0]) == type([]) and \
-       line[0][0][-1] == "\n":
-        s = "{}{}\033[m".format(st, "".join(line[0]))
-        line = line[1:]
-    for part in line:
-        if type(part) == type(""):
-            s += part
-        else:
-            s += "{}{}\033[m".format(st, "".join(part))
-    return s
-
-def merge(line):
-    """merge hidden and visible parts of line array to string
-    expects an array without initial hidden complete lines"""
-    s = ""
-    for part in line:
-        if type(part) == type(""):
-            s += part
-        else:
-            s += "".join(part)
-    return s
+def hiddenText(item):
+    """hidden text of a Line, or an appendix line as is"""
+    if type(item) == type(""):
+        return item
+    return "\n".join(item.hidden())
+
+
+class LineCache:
+    """visible and complete renderings of Lines, kept until invalidated
+
+    Entries are keyed by line identity, so every change to a line must
+    go through invalidate (see editor.splice). Lines without hidden
+    parts are their own renderings, and get no entry."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def entry(self, line):
+        e = self.entries.get(id(line))
+        if e is None or e[0] is not line:
+            # [line, visible, complete, offsets, hidden]
+            e = self.entries[id(line)] = [line, None, None, None, None]
+        return e
+
+    def invalidate(self, line):
+        self.entries.pop(id(line), None)
+
+    def visible(self, line):
+        if line.spans is None:
+            return line.text
+        e = self.entry(line)
+        if e[1] is None:
+            e[1] = line.visible()
+        return e[1]
+
+    def complete(self, line):
+        if line.spans is None:
+            return line.text
+        e = self.entry(line)
+        if e[2] is None:
+            e[2] = line.complete(st)
+        return e[2]
+
+    def offsets(self, line):
+        """visible offset of each part, followed by the visible length"""
+        if line.spans is None:
+            return [0, len(line.text)]
+        e = self.entry(line)
+        if e[3] is None:
+            e[3] = line.offsets()
+        return e[3]
+
+    def hidden(self, line):
+        """text of each hidden part"""
+        if line.spans is None:
+            return []
+        e = self.entry(line)
+        if e[4] is None:
+            e[4] = line.hidden()
+        return e[4]
+
+
+class LRU:
+    """last size values built from their keys, most recently used last"""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = collections.OrderedDict()
+
+    def get(self, key, build):
+        """value of key, built by build(key) if not kept"""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = self.entries[key] = build(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return value
+
+# Shared by every editor, keyed by pattern text and flags
+patterns = LRU(PATTERNS)
+# Keyed by substitution command text
+substitutions = LRU(PATTERNS)
+
+def pattern(text, flags=0):
+    """compiled regex of text"""
+    try:
+        return patterns.get((text, flags), lambda key: re.compile(*key))
+    except re.error as e:
+        error("Invalid pattern ({})".format(e.msg))
 
 
 class EdError(Exception):
@@ -119,19 +208,132 @@ def error(s):
     raise EdError(s)
 
 
+class Command:
+    """a compiled command line : its addresses, operation and argument"""
+    __slots__ = ("addrs", "op", "arg")
+
+    def __init__(self, addrs, op, arg=None):
+        self.addrs = addrs
+        self.op = op
+        self.arg = arg
+
+
 class editor:
     """an editor which doesn't really delete"""
-    text = [] # Main body (visible and hidden text)
-    appendix = [] # Hidden text after main body
     cursor = 0
     modified = False # To check whether to interrupt "q"
     override = False # For two consecutive "q"s (TODO consecutive "^D"s too)
     marks = False # For batch inserts with glob (TODO k command ?)
     newText = False # For batch inserts with glob
+    readline = staticmethod(input) # Where text and continuations come from
+    silent = False # No byte counts for e and w (running a script)
+    filename = None # For e and w without file name
+    journal = None # Where edits are persisted
+    index = None # Trigram index of visible text, once built
+    hiddenIndex = None # Trigram index of hidden text and appendix, once built
+    scans = 0 # Searches without index, since text was replaced
+    hiddenScans = 0 # Hidden searches without index, likewise
+    stats = None # Figures per command, once instrumented
+    lastPattern = None # For empty patterns (//, g//, s//)
+    lastSubstitution = None # For s without arguments
 
-    def __init__(self, strikethrough="\033[7m"):
+    def __init__(self, strikethrough="\033[7m", store=RopeStore):
         global st
         st = strikethrough
+        self.store = store # Line store backend (list is the reference one)
+        self.doc = Document(store=store)
+        self.text = []
+        self.commtab = {
+            "" : self.empty,
+            "q": self.quit,
+            "Q": self.quitforce,
+            "p": self.print,
+            "P": self.printHidden,
+            "n": self.enumerate,
+            "N": self.enumerateHidden,
+            "%": self.debug,
+            "T": self.printStats,
+            "i": self.insert,
+            "a": self.append,
+            "c": self.change,
+            "d": self.delete,
+            "j": self.join,
+            "=": self.printLine,
+            "h": self.printHelp
+        }
+
+    @property
+    def text(self):
+        """Main body (visible and hidden text)"""
+        return self.doc.lines
+
+    @text.setter
+    def text(self, lines):
+        self.doc.lines = self.store(map(Line.fromParts, lines))
+        self.forget()
+
+    @property
+    def appendix(self):
+        """Hidden text after main body"""
+        return self.doc.appendix
+
+    @appendix.setter
+    def appendix(self, lines):
+        self.doc.appendix = lines
+
+    def forget(self):
+        """drop renderings and indexes, when text is replaced"""
+        self.cache = LineCache()
+        self.index = None
+        self.hiddenIndex = None
+        self.scans = self.hiddenScans = 0
+
+    def splice(self, start, stop, lines):
+        """replace lines [start, stop[ of text, dropping their renderings
+        (lines can be given in nested list form)"""
+        for line in self.text[start:stop]:
+            self.cache.invalidate(line)
+            if self.index:
+                self.index.remove(line)
+            if self.hiddenIndex:
+                self.hiddenIndex.remove(line)
+        lines = list(map(Line.fromParts, lines))
+        self.doc.splice(start, stop, lines)
+        if self.index:
+            for line in lines:
+                self.index.add(line)
+        if self.hiddenIndex:
+            for line in lines:
+                self.hiddenIndex.add(line)
+        if self.journal:
+            self.journal.splice(start, stop, lines)
+        if self.stats:
+            self.stats.touched += max(stop - start, len(lines))
+
+    def hide(self, lines):
+        """add hidden complete lines at the start of the appendix"""
+        self.appendix = lines + self.appendix
+        if self.hiddenIndex:
+            for line in lines:
+                self.hiddenIndex.add(line)
+        if self.journal:
+            self.journal.prepend(lines)
+
+    def persist(self, fn):
+        """keep text and appendix in journal fn, starting from its content"""
+        journal = Journal(fn, Line.parts, Line.fromParts,
+                          lambda: (self.text, self.appendix))
+        state = journal.load()
+        if state is not None:
+            self.text, self.appendix = state
+            self.cursor = max(0, len(self.text) - 1)
+        journal.start(state is not None)
+        self.journal = journal
+
+    def instrument(self, memory=True):
+        """record figures for every command from now on (see stats.py),
+        tracing allocations if memory is set"""
+        self.stats = CommandStats(memory)
 
     def getNumber(self, comm):
         """Determine number at comm start, and where it stops or -1"""
@@ -168,119 +370,209 @@ class editor:
         rel += sign * offset
         return rel, end
 
-    def search(self, comm):
-        if len(comm) == 1:
-            # repeat previous regex, if there is one
-            error("No previous pattern")
-        # Determine where pattern stops = delim2
-        escape = False
+    def compileSearch(self, comm):
+        """compile pattern at comm start, and where it stops or -1"""
+        delim = comm[0]
+        esc = False
         for n, c in enumerate(comm[1:]):
-            if c == "\\":
-                escape = True
-            elif c == "/" and not escape:
-                delim2 = n
+            if esc: # Skip current character
+                esc = False
+            elif c == "\\":
+                esc = True
+            elif c == delim:
+                delim2 = n+1
                 break
         else:
             delim2 = len(comm)
-        # search for pattern
-        patt = re.compile(comm[1:delim2])
-        for m, line in enumerate(\
-              self.text[self.cursor:] + \
-              self.text[:self.cursor]):
-            if patt.search(visible(line)):
-                matchline += m
-                matchline %= len(self.text)
-                break
+        patt = self.compilePattern(comm[1:delim2])
         # check if pattern ends comm
         if delim2 >= len(comm) - 1:
-            delim2 = -1
-        return matchline, delim2
-
-    def getAddress(self, comm):
-        """Determine address at comm start, and where it stops or -1"""
-        if len(comm) == 0:
-            return -1, 0
-        if   comm[0] in "/?":  addr, end = self.search(comm)
-        elif comm[0] in "+-":  addr, end = self.cursor, 0
-        elif comm[0] == "." :  addr, end = self.cursor, 1
-        elif comm[0] == "$" :  addr, end = max(0, len(self.text) - 1), 1
-        elif isDigit(comm[0]): addr, end = self.getNumber(comm)
+            return patt, -1
+        return patt, delim2 + 1
+
+    def compilePattern(self, text):
+        """compiled regex of text, previous one if text is empty"""
+        if text == "":
+            if self.lastPattern is None:
+                error("No previous pattern")
+            return self.lastPattern
+        self.lastPattern = pattern(text)
+        return self.lastPattern
+
+    def candidates(self, patt):
+        """ids of lines which may match patt, or None for all lines"""
+        if self.index is not None and self.index.worn():
+            self.index = None
+        if self.index is None and len(self.text) >= INDEXLINES:
+            self.scans += 1
+            if self.scans >= INDEXSCANS:
+                self.index = TrigramIndex(Line.visible, self.text)
+        if self.index is None:
+            return None
+        return self.index.candidates(patt.pattern)
+
+    def matches(self, patt, start, stop):
+        """lines in [start, stop[ whose visible text matches patt"""
+        cands = self.candidates(patt)
+        for n, line in enumerate(iterate(self.text, start, stop), start):
+            if (cands is None or id(line) in cands) and \
+               patt.search(self.cache.visible(line)):
+                yield n
+
+    def search(self, patt):
+        """first line matching patt, from cursor on"""
+        if len(self.text) == 0:
+            error("No match")
+        for start, stop in [(self.cursor, len(self.text)), (0, self.cursor)]:
+            for n in self.matches(patt, start, stop):
+                return n
+        error("No match")
+
+    def hiddenCandidates(self, patt):
+        """ids of lines and appendix lines whose hidden text may match
+        patt, or None for all of them"""
+        if self.hiddenIndex is not None and self.hiddenIndex.worn():
+            self.hiddenIndex = None
+        if self.hiddenIndex is None and \
+           len(self.text) + len(self.appendix) >= INDEXLINES:
+            self.hiddenScans += 1
+            if self.hiddenScans >= INDEXSCANS:
+                self.hiddenIndex = TrigramIndex(hiddenText,
+                    itertools.chain(self.text, self.appendix))
+        if self.hiddenIndex is None:
+            return None
+        return self.hiddenIndex.candidates(patt.pattern)
+
+    def searchHidden(self, rng, patt):
+        """list hidden parts matching patt in range (or text and appendix),
+        as line:part (from 1), and appendix lines as $+n"""
+        if len(rng) == 0:
+            rng = [0, len(self.text) - 1]
+        cands = self.hiddenCandidates(patt)
+        found = False
+        for n, line in enumerate(iterate(self.text, rng[0], rng[-1]+1),
+                                 rng[0]):
+            if line.spans is None or (cands is not None and \
+                                      id(line) not in cands):
+                continue
+            for m, run in enumerate(self.cache.hidden(line)):
+                if patt.search(run):
+                    if not found:
+                        self.cursor = n
+                        found = True
+                    yield "{}:{}\t{}{}\033[m\n".format(n+1, m+1, st,
+                        run.replace("\n", "\\n"))
+        if rng[-1] >= len(self.text) - 1:
+            for n, line in enumerate(self.appendix):
+                if (cands is None or id(line) in cands) and \
+                   patt.search(line):
+                    found = True
+                    yield "$+{}\t{}{}\033[m\n".format(n+1, st,
+                        line.replace("\n", "\\n"))
+        if not found:
+            error("No match")
+
+    def compileAddress(self, comm, mark=False):
+        """Compile address at comm start, and where it stops or -1
+        Addresses are (base, line or pattern, offset) tuples, or None"""
+        if mark:
+            # address relative to glob mark
+            base, value, end = "k", None, 0
+        elif len(comm) == 0:
+            return None, 0
+        elif comm[0] in "/?":  base, (value, end) = "/", self.compileSearch(comm)
+        elif comm[0] in "+-":  base, value, end = ".", None, 0
+        elif comm[0] == "." :  base, value, end = ".", None, 1
+        elif comm[0] == "$" :  base, value, end = "$", None, 1
+        elif isDigit(comm[0]): base, (value, end) = "n", self.getNumber(comm)
         else:
             # No address, on non-empty command
-            return -1, 0
+            return None, 0
         # Determine relative offset (if needed) and update end
+        rel = 0
         if end != -1:
             rel, relend = self.getRelative(comm[end:])
-            addr += rel
             if relend == -1:
                 end = -1
             else:
                 end += relend
-        # Return address, if legal
-        if 0 <= addr < len(self.text):
-            return addr, end
-        error("Invalid address")
+        return (base, value, rel), end
 
-    def getRange(self, comm):
-        addr, end = self.getAddress(comm)
+    def compileRange(self, comm, mark=False):
+        addr, end = self.compileAddress(comm, mark)
         if end == -1:
-            if addr == -1:
+            # comm == single address
+            return [addr], -1
+        elif addr is None:
+            # empty address
+            if len(comm) == 0:
                 # empty comm
                 return [], -1
-            else:
-                # comm == single address
-                return [addr], -1
-        elif end == 0:
-            # empty address
-            if comm[0] == ",":
+            elif comm[0] == ",":
                 # nothing left of comma
-                addr = 0
+                addr = ("n", 0, 0)
             else:
                 # no range before command
                 return [], 0
         if comm[end] != ",":
             # single address, not range, before command
             return [addr], end
-        addr2, end2 = self.getAddress(comm[end+1:])
-        if addr2 == -1:
+        addr2, end2 = self.compileAddress(comm[end+1:])
+        if addr2 is None:
             # nothing right of comma
-            addr2 = len(self.text) - 1
-        elif addr2 < addr:
-            error("Invalid address")
+            addr2 = ("$", None, 0)
         if end2 == -1:
             # comm == range
             return [addr, addr2], -1
         # range, followed by command
         return [addr, addr2], end + 1 + end2
 
+    def getAddress(self, addr, mark=None):
+        """Determine line of compiled address"""
+        base, value, rel = addr
+        if   base == "/": line = self.search(value)
+        elif base == ".": line = self.cursor
+        elif base == "$": line = max(0, len(self.text) - 1)
+        elif base == "k": line = mark
+        else:             line = value
+        line += rel
+        # Return address, if legal
+        if 0 <= line < len(self.text):
+            return line
+        error("Invalid address")
+
+    def getRange(self, addrs, mark=None):
+        """Determine line range of compiled addresses"""
+        rng = [self.getAddress(addr, mark) for addr in addrs]
+        if len(rng) == 2 and rng[1] < rng[0]:
+            error("Invalid address")
+        return rng
+
     def empty(self, rng):
         if len(rng) == 0:
+            if self.cursor + 1 >= len(self.text):
+                error("Invalid address")
             self.cursor += 1
         else:
             self.cursor = rng[-1]
-        return visible(self.text[self.cursor]) + "\n"
+        return self.cache.visible(self.text[self.cursor]) + "\n"
 
     def updateMarks(self, rng, inc):
         if not self.marks:
             return
-        for n, i in enumerate(reversed(self.marks)):
-            if i >= rng[0]:
-                if i <= rng[-1]:
-                    del self.marks[-n-1]
-                else:
-                    self.marks[-n-1] += inc
+        self.marks.update(rng, inc)
 
     def print(self, rng, hide=True):
         if len(rng) == 0:
             rng = [self.cursor]
         for line in sub(self.text, rng):
-            yield visible(line) + "\n"
+            yield self.cache.visible(line) + "\n"
 
     def printHidden(self, rng):
         if len(rng) == 0:
             rng = [self.cursor]
         for line in sub(self.text, rng):
-            yield complete(line) + "\n"
+            yield self.cache.complete(line) + "\n"
         if rng[-1] == max(0, len(self.text) - 1):
             for n, line in enumerate(self.appendix):
                 yield "{}{}\033[m".format(st, line)
@@ -289,13 +581,13 @@ class editor:
         if len(rng) == 0:
             rng = [self.cursor]
         for n, line in enumerate(sub(self.text, rng)):
-            yield "{:6d}  {}\n".format(n+1, visible(line))
+            yield "{:6d}  {}\n".format(n+1, self.cache.visible(line))
 
     def enumerateHidden(self, rng):
         if len(rng) == 0:
             rng = [self.cursor]
         for n, line in enumerate(sub(self.text, rng)):
-            parts = complete(line).split("\n")
+            parts = self.cache.complete(line).split("\n")
             for hiddenline in parts[:-1]:
                 yield "\t" + hiddenline
             #yield "\033[m"
@@ -312,10 +604,10 @@ class editor:
             line = self.cursor
         else:
             line = rng[0]
-        newText = self.newText or getText()
+        newText = self.newText or getText(self.readline)
         if len(newText) > 0:
             self.modified = True
-        self.text[line:line] = newText
+        self.splice(line, line, newText)
         self.updateMarks([line], len(newText))
         self.cursor = line + len(newText) - 1
         if self.cursor == -1:
@@ -331,11 +623,11 @@ class editor:
         else:
             line = rng[-1]
         if len(self.text) == 0:
-            self.cursor = -1
-        newText = self.newText or getText()
+            line = -1
+        newText = self.newText or getText(self.readline)
         if len(newText) > 0:
             self.modified = True
-        self.text[line+1:line+1] = newText
+        self.splice(line+1, line+1, newText)
         self.updateMarks([line], len(newText))
         self.cursor = line + len(newText)
 
@@ -349,37 +641,28 @@ class editor:
         self.modified = True
         if len(rng) == 0:
             rng = [self.cursor]
-        for n, line in reversed(nsub(self.text, rng)):
-            if type(line[0]) == type([]) and \
-               line[0][0][-1] == "\n":
-                line = line[0] + [merge(line[1:]) + "\n"]
-            else:
-                line = [merge(line) + "\n"]
-            if n < len(self.text) - 1:
-                # merge line to beginning of next
-                nextline = self.text[n+1]
-                if type(nextline[0]) == type([]) and \
-                   nextline[0][0][-1] == "\n":
-                    nextline[0] = line + nextline[0]
-                else:
-                    nextline = [line] + nextline
-                self.text[n:n+2] = [nextline]
-            else:
-                self.appendix = line + self.appendix
-                self.text[-1:] = []
+        # Hide the whole range at once, as complete lines
+        hidden = []
+        for line in sub(self.text, rng):
+            lines, end = line.hiddenLines()
+            hidden += lines
+            hidden.append(line.text[end:] + "\n")
+        if rng[-1] < len(self.text) - 1:
+            # merge range to beginning of next line
+            nextline = self.text[rng[-1]+1].prepend(hidden)
+            self.splice(rng[0], rng[-1]+2, [nextline])
+        else:
+            self.hide(hidden)
+            self.splice(rng[0], len(self.text), [])
         self.updateMarks(rng, rng[0] - rng[-1] - 1) # Decrement by rng.len
         self.cursor = rng[0]
         if self.cursor == len(self.text):
             self.cursor = len(self.text) - 1
 
-    def glob(self, rng, comm):
-        if len(rng) == 0:
-            rng = [0, len(self.text)-1]
+    def compileGlob(self, comm):
+        """compile glob pattern and sub-commands (with their new text)"""
         if len(comm) == 1:
             error("Invalid pattern delimiter")
-        if len(comm) == 2:
-            # TODO repeat previous search pattern, if available
-            error("No previous pattern")
         delim = comm[1]
         esc = False
         for n, c in enumerate(comm[2:]):
@@ -394,6 +677,8 @@ class editor:
             delim2 = len(comm)
         if esc:
             error("Trailing backslash (\\)")
+        # Compiled first, for empty patterns of sub-commands
+        patt = self.compilePattern(comm[2:delim2])
         subcomms = comm[delim2+1:].split("\n")
         newTexts = []
         for n, subcomm in enumerate(subcomms):
@@ -413,40 +698,57 @@ class editor:
                     newTexts[-1].append([line])
                 else:
                     subcomms[n+1:] = []
-        if len(subcomms) == 0: # i.e. "<rng>g/<re>/[iac]"
+        commands = []
+        for n, subcomm in enumerate(subcomms):
+            # The first sub-command is addressed from each matching line
+            command = self.compile(subcomm, mark=(n == 0))
+            if subcomm[-1] in "iac":
+                commands.append((command, newTexts.pop(0)))
+            else:
+                commands.append((command, False))
+        return patt, commands
+
+    def glob(self, rng, glob):
+        if len(rng) == 0:
+            rng = [0, len(self.text)-1]
+        patt, commands = glob
+        if len(commands) == 0: # i.e. "<rng>g/<re>/[iac]"
             return
-        firstsubcomm = subcomms[0]
-        patt = re.compile(comm[2:delim2])
-        self.marks = []
-        for n in rng:
-            if patt.search(visible(self.text[n])):
-                self.marks.append(n)
+        self.marks = MarkIndex(self.matches(patt, rng[0], rng[-1]+1))
         while len(self.marks) > 0:
-            subcomms[0] = str(self.marks[0]+1) + firstsubcomm
-            del self.marks[0] # Even if line not modified :-P
-            newTextIdx = 0
-            for subcomm in subcomms:
-                if subcomm[-1] in "iac":
-                    self.newText = newTexts[newTextIdx]
-                    self.parse(subcomm)
-                    newTextIdx += 1
-                    self.newText = False
-                else:
-                    self.parse(subcomm)
+            # Pop even if line not modified :-P
+            mark = self.marks.pop()
+            for command, newText in commands:
+                self.newText = newText
+                self.execute(command, mark)
+                self.newText = False
         self.marks = False
 
-    def substitute(self, rng, comm):
-        if len(rng) == 0:
-            rng = [self.cursor]
+    def compileSubstitute(self, comm):
+        """compile pattern, replacement string and substitution count
+        (s repeats the previous substitution, s//... its pattern)"""
         if len(comm) == 1:
-            # TODO repeat previous substitution, if there is one
-            error("No previous substitution")
+            if self.lastSubstitution is None:
+                error("No previous substitution")
+            return self.lastSubstitution
         delim = comm[1]
         # TODO replace this with an FSA to avoid escaped delimiters
         delim2 = comm.find(delim, 2)
         if delim2 == -1:
             error("Invalid pattern delimiter")
-        patt = re.compile(comm[2:delim2])
+        if delim2 == 2:
+            patt = self.compilePattern("")
+            self.lastSubstitution = self.parseReplacement(comm, patt, delim2)
+        else:
+            self.lastSubstitution = substitutions.get(
+                comm, lambda comm: self.parseReplacement(
+                    comm, pattern(comm[2:delim2]), delim2))
+            self.lastPattern = self.lastSubstitution[0]
+        return self.lastSubstitution
+
+    def parseReplacement(self, comm, patt, delim2):
+        """substitution of patt, with replacement and count after delim2"""
+        delim = comm[1]
         # Determine replacement string and substitution count
         # TODO replace this with an FSA to avoid escaped delimiters
         delim3 = comm.find(delim, delim2+1)
@@ -463,22 +765,30 @@ class editor:
                 cnt = int(comm[delim3+1:])
             else:
                 error("Invalid command suffix")
+        return patt, repl, cnt
+
+    def substitute(self, rng, sub):
+        if len(rng) == 0:
+            rng = [self.cursor]
+        patt, repl, cnt = sub
         globmatched = False
         for n, line in nsub(self.text, rng):
             # TODO for sub count != 1 repeat the whole thing
             # warning : avoid regex recursion !!!
-            vis = ""
+            vis = self.cache.visible(line)
+            offsets = self.cache.offsets(line)
+            line = line.parts()
             matched = False
             for m, part in enumerate(line):
                 if type(part) == type([]):
                     continue
-                vis += part
-                match = patt.search(vis)
+                # search visible text up to the end of this part
+                match = patt.search(vis, 0, offsets[m+1])
                 if not match:
                     continue
                 # there is a match !
                 globmatched = matched = True
-                if len(vis) - match.start() > len(part):
+                if offsets[m+1] - match.start() > len(part):
                     # goes across hidden content, change line
                     hid = ""
                     for part in line:
@@ -490,7 +800,7 @@ class editor:
                         else:
                             hid += part
                     hid += "\n"
-                    newline = patt.sub(repl, visible(line), 1)
+                    newline = patt.sub(repl, vis, 1)
                     if type(line[0]) == type([]) and \
                        line[0][0][-1] == "\n":
                         # there already are hidden lines
@@ -500,8 +810,8 @@ class editor:
                         line = [[hid], newline]
                 else:
                     # change in place
-                    start = match.start() - (len(vis) - len(part))
-                    end   = match.end()   - (len(vis) - len(part))
+                    start = match.start() - offsets[m]
+                    end   = match.end()   - offsets[m]
                     if start == end: # zero-length matches ("^", "$")
                         line[m] = patt.sub(repl, line[m])
                     else:
@@ -518,12 +828,12 @@ class editor:
                     # TODO allow newlines
                 break
             if matched:
-                self.cursor = rng[0] + n
-                self.text[self.cursor] = line
+                self.cursor = n
+                self.splice(n, n+1, [line])
         self.updateMarks(rng, 0)
         if globmatched:
             self.modified = True
-            return visible(self.text[self.cursor]) + "\n"
+            return self.cache.visible(self.text[self.cursor]) + "\n"
         else:
             error("No match")
 
@@ -533,22 +843,124 @@ class editor:
             if self.cursor + 1 == len(self.text):
                 error("Invalid address")
             rng = [self.cursor, self.cursor + 1]
-        newline = self.text[rng[0]][:]
-        for line in sub(self.text, [rng[0]+1, rng[-1]]):
-            if type(newline[-1]) == type([]) and \
-               type(line[0]) == type([]):
-                newline[-1].extend(line[0])
-                newline.extend(line[1:])
-            else:
-                newline.extend(line)
-        self.text[rng[0]:rng[-1]+1] = [newline]
+        newline = self.text[rng[0]].join(sub(self.text, [rng[0]+1, rng[-1]]))
+        self.splice(rng[0], rng[-1]+1, [newline])
         self.updateMarks(rng, rng[0] - rng[-1]) # decrement by rng.len - 1
         self.cursor = rng[0]
 
+    def editFile(self, rng, fn):
+        """edit file (soft quit current buffer), text or saved with W
+        Lines of text are mapped, and only decoded once needed."""
+        if len(rng) > 0:
+            error("Unexpected address")
+        if self.modified and not self.override:
+            self.override = True
+            error("Warning: buffer modified")
+        fn = fn or self.filename
+        if not fn:
+            error("No current filename")
+        try:
+            with open(fn, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if f.read(len(MAGIC)) == MAGIC.encode():
+                    f.seek(0)
+                    wrapper = io.TextIOWrapper(f, "utf-8", newline="")
+                    doc = Document.read(wrapper, self.store)
+                    wrapper.detach()
+                else:
+                    f.seek(0)
+                    doc = Document(store=self.store)
+                    # Lines are already built, skip conversion
+                    if hasattr(self.store, "fromFile"):
+                        doc.lines = self.store.fromFile(f, Line)
+                    else:
+                        lines = f.read().decode().split("\n")
+                        if lines[-1] == "":
+                            lines.pop()
+                        doc.lines = self.store(map(Line, lines))
+        except OSError:
+            error("Cannot open input file")
+        except UnicodeDecodeError:
+            error("Cannot decode input file (not UTF-8)")
+        except ValueError:
+            error("Invalid nohide document")
+        self.doc = doc
+        self.forget()
+        self.filename = fn
+        self.modified = False
+        self.cursor = max(0, len(self.text) - 1)
+        if self.journal:
+            self.journal.checkpoint()
+        return "{}\n".format(size)
+
+    def writeFile(self, rng, fn):
+        """write visible range (or text) to file, in large blocks"""
+        fn = fn or self.filename
+        if not fn:
+            error("No current filename")
+        if len(rng) == 0:
+            # Unread chunks of a mapped file are copied as they are
+            chunks = getattr(self.text, "chunks", [self.text])
+        else:
+            chunks = [sub(self.text, rng)]
+        # Replace fn only once written, it may be mapped by the buffer
+        tmp = fn + ".nohide~"
+        size = 0
+        try:
+            with open(tmp, "wb", buffering=BLOCK) as f:
+                for chunk in chunks:
+                    if type(chunk) is FileChunk:
+                        size += f.write(chunk.bytes())
+                    else:
+                        size += f.write("".join(
+                            [line.visible() + "\n" for line in chunk]
+                        ).encode())
+            if os.path.exists(fn):
+                shutil.copymode(fn, tmp)
+            os.replace(tmp, fn)
+        except OSError:
+            error("Cannot open output file")
+        if self.filename is None:
+            self.filename = fn
+        if len(rng) == 0:
+            self.modified = False
+        return "{}\n".format(size)
+
+    def writeDocument(self, rng, fn):
+        """write text with hidden content to file, as nano saves it"""
+        if len(rng) > 0:
+            error("Unexpected address")
+        fn = fn or self.filename
+        if not fn:
+            error("No current filename")
+        tmp = fn + ".nohide~"
+        try:
+            with open(tmp, "w", encoding="utf-8", newline="",
+                      buffering=BLOCK) as f:
+                self.doc.write(f)
+            size = os.path.getsize(tmp)
+            if os.path.exists(fn):
+                shutil.copymode(fn, tmp)
+            os.replace(tmp, fn)
+        except OSError:
+            error("Cannot open output file")
+        if self.filename is None:
+            self.filename = fn
+        self.modified = False
+        return "{}\n".format(size)
+
     def debug(self, rng):
         yield str(self.text) + "\n"
         yield str(self.appendix) + "\n"
 
+    def printStats(self, rng):
+        """print figures per command"""
+        if len(rng) > 0:
+            error("Unexpected address")
+        if not self.stats:
+            error("No statistics (ed -t)")
+        return self.stats.report()
+
     def printLine(self, rng):
         """print last line in range or cursor"""
         if len(rng) == 0:
@@ -574,49 +986,90 @@ class editor:
             return
         sys.exit(0)
 
-    def parse(self, comm):
-        rng, end = self.getRange(comm)
+    def compile(self, comm, mark=False, more=None):
+        """parse command line once, to execute it any number of times
+        (more reads glob continuation lines)"""
+        addrs, end = self.compileRange(comm, mark)
         if end == -1: comm = ""
         else:         comm = comm[end:]
-        if comm != "q": # two consecutive "q"s force quit
+        if comm[:1] in ("e", "w", "W") and comm[1:2] in ("", " "):
+            # file commands, with optional file name
+            return Command(addrs, comm[0], comm[2:])
+        if len(comm) <= 1 and comm != "s":
+            if comm not in self.commtab:
+                error("Unknown command")
+            return Command(addrs, comm)
+        if comm[0] in self.commtab:
+            error("Invalid command suffix")
+        if comm[0] == "H":
+            patt, end = self.compileSearch(comm[1:])
+            if end != -1:
+                error("Invalid command suffix")
+            return Command(addrs, "H", patt)
+        if comm[0] == "g":
+            while more and comm[-1] == "\\":
+                comm = comm[:-1] + "\n" + more()
+            return Command(addrs, "g", self.compileGlob(comm))
+        elif comm[0] == "s":
+            return Command(addrs, "s", self.compileSubstitute(comm))
+        error("Unknown command")
+
+    def execute(self, command, mark=None):
+        if self.stats:
+            self.stats.measure(command.op, self.dispatch, command, mark)
+        else:
+            self.dispatch(command, mark)
+
+    def dispatch(self, command, mark=None):
+        rng = self.getRange(command.addrs, mark)
+        if command.op not in ("q", "e"): # two consecutive "q"s force quit
             self.override = False
-        commtab = {
-            "" : self.empty,
-            "q": self.quit,
-            "" : self.empty,
-            "q": self.quit,
-            "Q": self.quitforce,
-            "p": self.print,
-            "P": self.printHidden,
-            "n": self.enumerate,
-            "N": self.enumerateHidden,
-            "%": self.debug,
-            "i": self.insert,
-            "a": self.append,
-            "c": self.change,
-            "d": self.delete,
-            "j": self.join,
-            "=": self.printLine,
-            "h": self.printHelp
-        }
-        if len(comm) <= 1:
+        if command.op in ("e", "w", "W"):
+            files = {"e": self.editFile, "w": self.writeFile,
+                     "W": self.writeDocument}
+            size = files[command.op](rng, command.arg)
+            if not self.silent:
+                sys.stdout.write(size)
+        elif command.op == "g":
+            # Assume glob returns nothing
+            self.glob(rng, command.arg)
+        elif command.op == "s":
+            sys.stdout.write(self.substitute(rng, command.arg) or "")
+        elif command.op == "H":
+            for line in self.searchHidden(rng, command.arg):
+                print(line, end="")
+        else:
             # Call command, or build generator
-            gen = commtab[comm](rng)
+            gen = self.commtab[command.op](rng)
             if gen:
                 for line in gen:
                     print(line, end="")
-        else:
-            if comm[0] in commtab:
-                error("Invalid command suffix")
-            if comm[0] == "g":
-                while comm[-1] == "\\":
-                    comm = comm[:-1] + "\n" + input("")
-                # Assume glob returns nothing
-                self.glob(rng, comm)
-            elif comm[0] == "s":
-                sys.stdout.write(self.substitute(rng, comm) or "")
-            else:
-                error("Unknown command")
+
+    def parse(self, comm):
+        self.execute(self.compile(comm, more=self.readline))
+
+    def run(self, script):
+        """run commands from script file without prompts, report errors
+        on stderr as "?<line>:<message>" and return exit status"""
+        self.lineno = 0
+        self.silent = True
+        def readline():
+            line = script.readline()
+            if line == "":
+                raise EOFError
+            self.lineno += 1
+            return line[:-1] if line[-1] == "\n" else line
+        self.readline = readline
+        status = 0
+        while True:
+            try:
+                self.parse(readline())
+            except EdError as e:
+                sys.stderr.write("?{}:{}\n".format(self.lineno, e.msg))
+                status = 1
+            except (EOFError, SystemExit):
+                # end of script, or quit
+                return status
 
     def edit(self):
         print("type h for help")
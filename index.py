@@ -0,0 +1,132 @@
+"""trigram index of line contents, to narrow regex searches
+
+Lines are indexed by identity, they must not change while indexed
+(ed only replaces whole Lines, see editor.splice).
+"""
+
+from array import array
+
+# Characters with a special meaning in regular expressions
+SPECIAL = ".^$*+?{}[]()|\\"
+# Escapes that stand for classes of characters or positions
+CLASSES = "dDwWsSbBAZ0123456789"
+# Escapes followed by a character code, and its length
+CODES = {"x": 2, "u": 4, "U": 8}
+# Postings longer than this many times the candidates are not intersected
+INTERSECT = 16
+
+
+def trigrams(text):
+    return {text[n:n+3] for n in range(len(text) - 2)}
+
+
+def literals(pattern):
+    """strings that every match of pattern contains (maybe none)"""
+    if "|" in pattern or "(?" in pattern:
+        # alternatives, or flags, are not worth it
+        return []
+    runs = [""]
+    depth = 0
+    n = 0
+    while n < len(pattern):
+        c = pattern[n]
+        n += 1
+        if c == "\\" and n < len(pattern):
+            c = pattern[n]
+            n += 1
+            if c in CLASSES or c.isalnum():
+                # skip the code, or group number, the escape stands for
+                if c in CODES:
+                    n += CODES[c]
+                elif c == "N" and pattern[n:n+1] == "{":
+                    n = pattern.find("}", n) + 1 or len(pattern)
+                elif c.isdigit():
+                    while pattern[n:n+1].isdigit():
+                        n += 1
+                runs.append("")
+                continue
+        elif c == "[":
+            # skip character class
+            if pattern[n:n+1] == "^":
+                n += 1
+            if pattern[n:n+1] == "]":
+                n += 1
+            while n < len(pattern) and pattern[n] != "]":
+                n += 2 if pattern[n] == "\\" else 1
+            n += 1
+            runs.append("")
+            continue
+        elif c in "*?{":
+            # previous character is optional
+            runs[-1] = runs[-1][:-1]
+            runs.append("")
+            if c == "{":
+                n = pattern.find("}", n) + 1 or len(pattern)
+            continue
+        elif c == "+":
+            runs.append("")
+            continue
+        elif c in SPECIAL:
+            depth += (c == "(") - (c == ")")
+            runs.append("")
+            continue
+        if depth == 0:
+            runs[-1] += c
+    return [run for run in runs if len(run) >= 3]
+
+
+class TrigramIndex:
+    """lines holding each trigram of their text (as given by key)
+
+    Postings are arrays of line ids, only appended to : removed lines
+    are kept aside until their ids are added again, and their entries
+    are dropped when the index is rebuilt (see worn). An id reused by
+    another line only makes it a false candidate, which searches check
+    anyway."""
+
+    def __init__(self, key, lines=()):
+        self.key = key
+        self.postings = {}
+        self.removed = set()
+        self.entries = 0 # Entries in postings
+        self.stale = 0 # Entries of removed lines
+        for line in lines:
+            self.add(line)
+
+    def add(self, line):
+        ident = id(line)
+        self.removed.discard(ident)
+        postings = self.postings
+        grams = trigrams(self.key(line))
+        for trigram in grams:
+            posting = postings.get(trigram)
+            if posting is None:
+                posting = postings[trigram] = array("Q")
+            posting.append(ident)
+        self.entries += len(grams)
+
+    def remove(self, line):
+        self.removed.add(id(line))
+        self.stale += len(trigrams(self.key(line)))
+
+    def worn(self):
+        """whether entries of removed lines are worth rebuilding for
+        (over a third of all entries)"""
+        return self.stale * 3 > self.entries
+
+    def candidates(self, pattern):
+        """ids of lines which may match pattern, or None for all lines"""
+        grams = set()
+        for literal in literals(pattern):
+            grams |= trigrams(literal)
+        if len(grams) == 0:
+            return None
+        postings = sorted((self.postings.get(gram, ()) for gram in grams),
+                          key=len)
+        cands = set(postings[0])
+        for posting in postings[1:]:
+            if len(posting) > INTERSECT * len(cands):
+                # cheaper to check remaining candidates with the regex
+                break
+            cands.intersection_update(posting)
+        return cands - self.removed
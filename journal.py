@@ -0,0 +1,136 @@
+"""append-only journal of line edits
+
+A journal file holds one record per text line :
+
+    C <n> <json>    checkpoint of n lines, and of the appendix (json)
+    L <json>        ... each of the checkpointed lines
+    S <json>        splice : [start, stop, [lines]]
+    A <json>        [lines] added at the start of the appendix
+
+An edit only appends its own record. Every so many records the journal
+is rewritten as a checkpoint of the whole text, so reopening decodes
+that checkpoint and at most as many records. Files holding several
+checkpoints (as written before they were compacted) are decoded from
+the last complete one on.
+"""
+
+import os
+import json
+
+# Records between checkpoints
+CHECKPOINT = 1000
+# One encoder for every record, json.dumps builds one per call
+dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+class Journal:
+    """journal file fn, for lines translated by encode and decode
+    snapshot returns the current lines and appendix, to checkpoint them"""
+
+    def __init__(self, fn, encode, decode, snapshot, every=None):
+        self.fn = fn
+        self.encode = encode
+        self.decode = decode
+        self.snapshot = snapshot
+        self.every = every or CHECKPOINT
+        self.records = 0
+        self.end = 0 # End of last complete record
+        self.f = None
+
+    def load(self):
+        """lines and appendix at the end of journal, or None if empty"""
+        checkpoints = []
+        try:
+            with open(self.fn, "rb") as f:
+                for record in f:
+                    if record[-1:] != b"\n":
+                        # interrupted write
+                        break
+                    if record[:2] == b"C ":
+                        checkpoints.append(self.end)
+                    self.end += len(record)
+                for pos in reversed(checkpoints):
+                    f.seek(pos)
+                    state = self.replay(f)
+                    if state is not None:
+                        return state
+                    # drop interrupted checkpoint, and what follows it
+                    self.end = pos
+        except FileNotFoundError:
+            pass
+        return None
+
+    def replay(self, f):
+        """apply records from a checkpoint on, None if it is incomplete"""
+        count, appendix = f.readline()[2:].split(b" ", 1)
+        count = int(count)
+        appendix = json.loads(appendix)
+        lines = []
+        read = 0 # L records, splices may change len(lines) once all read
+        for record in f:
+            if record[-1:] != b"\n":
+                # interrupted write
+                break
+            kind = record[:1]
+            if read < count and kind != b"L" or kind == b"C":
+                # interrupted checkpoint, or the following one
+                break
+            data = json.loads(record[2:])
+            if read < count:
+                lines.append(self.decode(data))
+                read += 1
+            elif kind == b"S":
+                start, stop, new = data
+                lines[start:stop] = map(self.decode, new)
+            elif kind == b"A":
+                appendix[0:0] = data
+            else:
+                break
+        if read < count:
+            return None
+        return lines, appendix
+
+    def start(self, loaded=True):
+        """append further records (after a checkpoint if nothing loaded)"""
+        if not loaded:
+            self.checkpoint()
+            return
+        # drop interrupted record or checkpoint
+        os.truncate(self.fn, self.end)
+        self.f = open(self.fn, "a", encoding="utf-8")
+
+    def write(self, record):
+        self.f.write(record)
+        self.f.flush()
+        self.records += 1
+        if self.records >= self.every:
+            self.checkpoint()
+
+    def splice(self, start, stop, lines):
+        """lines [start, stop[ replaced with lines"""
+        self.write("S {}\n".format(dumps(
+            [start, stop, [self.encode(line) for line in lines]])))
+
+    def prepend(self, lines):
+        """lines added at the start of the appendix"""
+        self.write("A {}\n".format(dumps(lines)))
+
+    def checkpoint(self):
+        """replace the journal with a checkpoint of the current lines"""
+        lines, appendix = self.snapshot()
+        tmp = self.fn + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write("C {} {}\n".format(len(lines), dumps(list(appendix))))
+            f.writelines("L {}\n".format(dumps(self.encode(line)))
+                         for line in lines)
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(tmp, self.fn)
+        self.f = open(self.fn, "a", encoding="utf-8")
+        self.records = 0
+
+    def close(self):
+        if self.f:
+            self.f.close()
+            self.f = None
@@ -0,0 +1,240 @@
+"""compact representation of ed lines
+
+ed describes a line as a list of parts : visible strings, and lists of
+hidden strings, e.g. [["old line\n"], "new ", ["bad"], "line"].
+A Line holds the same parts as a single string, plus one array of the
+offsets where each string ends, tagged with its kind. A line which is
+a single visible string (most of them) has no array at all.
+"""
+
+from array import array
+
+# Kinds of strings, stored in the two low bits of each span
+VISIBLE = 0
+HIDDEN = 1 # First string of a hidden part
+MORE = 2   # Following strings of the same hidden part
+
+
+class Line:
+    """a line of text, and the hidden text accumulated in it"""
+    __slots__ = ("text", "spans")
+
+    def __init__(self, text="", spans=None):
+        self.text = text
+        if spans is not None and len(spans) == 1 and spans[0] & 3 == VISIBLE:
+            spans = None
+        self.spans = spans # None for a single visible string
+
+    @classmethod
+    def fromParts(cls, parts):
+        """build Line from nested list form (Lines are returned as is)"""
+        if isinstance(parts, Line):
+            return parts
+        if len(parts) == 1 and type(parts[0]) == type(""):
+            return cls(parts[0])
+        text = []
+        spans = array("I")
+        end = 0
+        for part in parts:
+            if type(part) == type(""):
+                end += len(part)
+                text.append(part)
+                spans.append(end << 2 | VISIBLE)
+            else:
+                kind = HIDDEN
+                for hidden in part:
+                    end += len(hidden)
+                    text.append(hidden)
+                    spans.append(end << 2 | kind)
+                    kind = MORE
+        return cls("".join(text), spans)
+
+    @classmethod
+    def fromMask(cls, text, mask):
+        """build Line from text and its visibility mask (one byte per
+        character, 1 if visible) ; complete lines hidden at its start
+        are kept as separate strings of one part (see hiddenLines)"""
+        spans = array("I")
+        start = 0
+        shown = True
+        while start < len(text):
+            end = mask.find(b"\x00" if shown else b"\x01", start, len(text))
+            if end == -1:
+                end = len(text)
+            if shown:
+                if end > start:
+                    spans.append(end << 2 | VISIBLE)
+            else:
+                kind = HIDDEN
+                leading = start == 0
+                while start < end:
+                    nl = text.find("\n", start, end) + 1
+                    if nl == 0:
+                        nl = end
+                        if leading:
+                            # after complete lines hidden at line start,
+                            # the rest of the run is a part of its own
+                            kind = HIDDEN
+                    spans.append(nl << 2 | kind)
+                    kind = MORE
+                    start = nl
+            start = end
+            shown = not shown
+        return cls(text, spans if len(spans) > 0 else None)
+
+    def mask(self):
+        """visibility mask of text, one byte per character (1 if visible)"""
+        mask = bytearray()
+        for start, end, kind in self.fragments():
+            mask += bytearray([kind == VISIBLE]) * (end - start)
+        return mask
+
+    def allSpans(self):
+        if self.spans is None:
+            return array("I", [len(self.text) << 2 | VISIBLE])
+        return self.spans
+
+    def fragments(self):
+        """start, end and kind of every string in line"""
+        start = 0
+        for span in self.allSpans():
+            yield start, span >> 2, span & 3
+            start = span >> 2
+
+    def parts(self):
+        """nested list form of line"""
+        parts = []
+        for start, end, kind in self.fragments():
+            s = self.text[start:end]
+            if kind == VISIBLE:
+                parts.append(s)
+            elif kind == HIDDEN:
+                parts.append([s])
+            else:
+                parts[-1].append(s)
+        return parts
+
+    def visible(self):
+        if self.spans is None:
+            return self.text
+        return "".join([self.text[start:end]
+                        for start, end, kind in self.fragments()
+                        if kind == VISIBLE])
+
+    def complete(self, st):
+        """text with hidden parts between st and a reset sequence"""
+        if self.spans is None:
+            return self.text
+        s = []
+        hidden = None
+        for start, end, kind in self.fragments():
+            if kind != MORE and hidden is not None:
+                s.append("{}{}\033[m".format(st, self.text[hidden:start]))
+                hidden = None
+            if kind == VISIBLE:
+                s.append(self.text[start:end])
+            elif kind == HIDDEN:
+                hidden = start
+        if hidden is not None:
+            s.append("{}{}\033[m".format(st, self.text[hidden:]))
+        return "".join(s)
+
+    def hidden(self):
+        """text of each hidden part"""
+        runs = []
+        if self.spans is None:
+            return runs
+        for start, end, kind in self.fragments():
+            if kind == HIDDEN:
+                runs.append(self.text[start:end])
+            elif kind == MORE:
+                runs[-1] += self.text[start:end]
+        return runs
+
+    def offsets(self):
+        """visible offset of each part, followed by the visible length"""
+        offsets = [0]
+        for start, end, kind in self.fragments():
+            if kind == VISIBLE:
+                offsets.append(offsets[-1] + end - start)
+            elif kind == HIDDEN:
+                offsets.append(offsets[-1])
+        return offsets
+
+    def hiddenLines(self):
+        """hidden complete lines at line start, and where they end"""
+        if self.spans is None or self.spans[0] & 3 != HIDDEN or \
+           self.text[(self.spans[0] >> 2) - 1:self.spans[0] >> 2] != "\n":
+            return [], 0
+        lines = []
+        start = 0
+        for n, span in enumerate(self.spans):
+            if n > 0 and span & 3 != MORE:
+                break
+            lines.append(self.text[start:span >> 2])
+            start = span >> 2
+        return lines, start
+
+    def prepend(self, lines):
+        """Line with hidden complete lines added at its start"""
+        prefix = "".join(lines)
+        spans = array("I")
+        end = 0
+        kind = HIDDEN
+        for line in lines:
+            end += len(line)
+            spans.append(end << 2 | kind)
+            kind = MORE
+        if self.hiddenLines()[0]:
+            # extend existing hidden lines
+            spans.extend(self.shifted(len(prefix), MORE))
+        else:
+            spans.extend(self.shifted(len(prefix)))
+        return Line(prefix + self.text, spans)
+
+    def join(self, lines):
+        """Line followed by lines, merging adjacent hidden parts"""
+        text = [self.text]
+        spans = array("I", self.allSpans())
+        end = len(self.text)
+        for line in lines:
+            if len(spans) > 0 and spans[-1] & 3 != VISIBLE and \
+               len(line) > 0 and line.allSpans()[0] & 3 == HIDDEN:
+                spans.extend(line.shifted(end, MORE))
+            else:
+                spans.extend(line.shifted(end))
+            text.append(line.text)
+            end += len(line.text)
+        return Line("".join(text), spans)
+
+    def shifted(self, offset, first=None):
+        """spans moved by offset, the first one changing kind to first"""
+        spans = array("I", [span + (offset << 2) for span in self.allSpans()])
+        if first is not None:
+            spans[0] = spans[0] & ~3 | first
+        return spans
+
+    # Nested list compatibility
+
+    def __iter__(self):
+        return iter(self.parts())
+
+    def __len__(self):
+        if self.spans is None:
+            return 1
+        return sum(1 for span in self.spans if span & 3 != MORE)
+
+    def __getitem__(self, i):
+        return self.parts()[i]
+
+    def __eq__(self, other):
+        if isinstance(other, Line):
+            return self.text == other.text and self.spans == other.spans
+        if isinstance(other, list):
+            return self.parts() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.parts())
@@ -0,0 +1,93 @@
+"""line marks left by glob, kept sorted while the buffer changes"""
+
+
+class MarkIndex:
+    """sorted line numbers, popped in order, shifted in bulk
+
+    Each mark is stored as its initial line plus a fenwick tree of
+    shifts applied to every mark from some index on. A second fenwick
+    tree counts marks still alive, to reach the k-th one without
+    scanning the dropped ones. Every operation is O(log n), plus
+    O(log(n) log(d)) to look up a line d marks away from the first."""
+
+    def __init__(self, lines):
+        self.base = list(lines)
+        self.shifts = [0] * (len(self.base) + 1)
+        self.alive = [0] * (len(self.base) + 1)
+        for n in range(1, len(self.alive)):
+            self.alive[n] += 1
+            parent = n + (n & -n)
+            if parent < len(self.alive):
+                self.alive[parent] += self.alive[n]
+        self.count = len(self.base)
+        self.top = 1
+        while self.top * 2 <= len(self.base):
+            self.top *= 2
+
+    def __len__(self):
+        return self.count
+
+    def shift(self, i, inc):
+        """add inc to marks from index i on"""
+        i += 1
+        while i < len(self.shifts):
+            self.shifts[i] += inc
+            i += i & -i
+
+    def position(self, i):
+        """current line of mark at index i"""
+        line = self.base[i]
+        i += 1
+        while i > 0:
+            line += self.shifts[i]
+            i -= i & -i
+        return line
+
+    def kth(self, k):
+        """index of the k-th (from 0) mark still alive"""
+        alive = self.alive
+        i = 0
+        step = self.top
+        while step:
+            if i + step < len(alive) and alive[i+step] <= k:
+                i += step
+                k -= alive[i]
+            step >>= 1
+        return i
+
+    def drop(self, i):
+        self.count -= 1
+        i += 1
+        while i < len(self.alive):
+            self.alive[i] -= 1
+            i += i & -i
+
+    def first(self, line):
+        """rank of the first alive mark at or after line"""
+        # Gallop from the first mark, glob mostly edits around it
+        lo, hi = 0, 1
+        while hi < self.count and self.position(self.kth(hi - 1)) < line:
+            lo, hi = hi, hi * 2
+        hi = min(hi, self.count)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.position(self.kth(mid)) < line:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def pop(self):
+        """remove and return first mark"""
+        i = self.kth(0)
+        self.drop(i)
+        return self.position(i)
+
+    def update(self, rng, inc):
+        """drop marks inside rng, shift marks after it by inc"""
+        start = self.first(rng[0])
+        stop = self.first(rng[-1] + 1)
+        if stop < self.count:
+            self.shift(self.kth(stop), inc)
+        for k in range(start, stop):
+            self.drop(self.kth(start))
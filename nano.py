@@ -1,18 +1,196 @@
 #!/usr/bin/env python3
 
 import curses
+import sys
+import json
+import time
+import itertools
+from journal import Journal
+from document import Document, MAGIC, runs, fromRuns, writeLines
 
 # vertical offset
 VOFF = 2
 HOFF = 0
+# Write buffer size for saves
+BLOCK = 1 << 20
 
-def cvToChar(cv):
-    # cv = [char, vis]
-    if cv[1]:
-        return cv[0]
-    return ""
+# Control keys, as curses getkey returns them
+INTERRUPT = "\x03" # ^C
+DEBUG = "\x04"     # ^D
+CUT = "\x0b"       # ^K
+WRITE = "\x0f"     # ^O
+UNCUT = "\x15"     # ^U
+TOGGLE = "\x16"    # ^V
+EXIT = "\x18"      # ^X
+BACKSPACE = "\x7f"
+# Bracketed paste mode, and the markers around pasted text
+PASTE_ON = "\x1b[?2004h"
+PASTE_OFF = "\x1b[?2004l"
+PASTE_START = "\x1b[200~"
+PASTE_END = "\x1b[201~"
 
-class Editor():
+# Terminal input sequences, and the keys curses names them
+SEQUENCES = {
+    "\x1b[A": "KEY_UP",
+    "\x1b[B": "KEY_DOWN",
+    "\x1b[C": "KEY_RIGHT",
+    "\x1b[D": "KEY_LEFT",
+    "\x1bOA": "KEY_UP",
+    "\x1bOB": "KEY_DOWN",
+    "\x1bOC": "KEY_RIGHT",
+    "\x1bOD": "KEY_LEFT",
+    "\r": "\n",
+    "\b": "KEY_BACKSPACE",
+}
+
+def mask(text, visible=1):
+    """visibility mask of text : one byte per character, 1 if visible"""
+    return bytearray([visible]) * len(text)
+
+def encodeLine(line):
+    """[text, runs] : runs alternate visible and hidden character counts"""
+    text, vis = line
+    return [text, runs(vis)]
+
+def decodeLine(data):
+    text, counts = data
+    return text, fromRuns(counts)
+
+def keys(data):
+    """split raw terminal input into keys, as curses getkey names them"""
+    n = 0
+    while n < len(data):
+        for seq, key in SEQUENCES.items():
+            if data.startswith(seq, n):
+                yield key
+                n += len(seq)
+                break
+        else:
+            yield data[n]
+            n += 1
+
+def castInput(f):
+    """terminal input recorded in asciinema cast f (v2, with --stdin)"""
+    f.readline() # header
+    for event in f:
+        if event.strip():
+            t, kind, data = json.loads(event)
+            if kind == "i":
+                yield data
+
+def replay(data, engine=None):
+    """apply raw terminal input data to engine (headless by default),
+    until it quits ; return engine, and the number of keys applied"""
+    engine = engine or Engine()
+    pressed = list(keys(data))
+    count = pressed.index(EXIT) + 1 if EXIT in pressed else len(pressed)
+    engine.handleKeys(pressed[:count])
+    return engine, count
+
+def pending(stdscr):
+    """keys already waiting in input, read without blocking"""
+    waiting = []
+    stdscr.nodelay(True)
+    try:
+        while True:
+            waiting.append(stdscr.getkey())
+    except curses.error:
+        pass
+    finally:
+        stdscr.nodelay(False)
+    return waiting
+
+class VisCounts:
+    """fenwick tree over a visibility mask, counting visible characters
+    The mask must only be changed through hide (see Engine.counts)."""
+
+    def __init__(self, mask):
+        self.mask = mask
+        self.size = len(mask)
+        prefix = [0]
+        prefix += itertools.accumulate(mask)
+        self.tree = [0] + [prefix[i] - prefix[i - (i & -i)]
+                           for i in range(1, self.size + 1)]
+        self.total = prefix[-1]
+        self.top = 1
+        while self.top * 2 <= self.size:
+            self.top *= 2
+
+    def before(self, i):
+        """visible characters before position i"""
+        count = 0
+        while i > 0:
+            count += self.tree[i]
+            i -= i & -i
+        return count
+
+    def select(self, k):
+        """position of the k-th (from 0) visible character"""
+        tree = self.tree
+        i = 0
+        step = self.top
+        while step:
+            if i + step <= self.size and tree[i+step] <= k:
+                i += step
+                k -= tree[i]
+            step >>= 1
+        return i
+
+    def hide(self, i):
+        if self.mask[i]:
+            self.mask[i] = 0
+            self.total -= 1
+            i += 1
+            while i <= self.size:
+                self.tree[i] -= 1
+                i += i & -i
+
+class GapLine:
+    """line being typed into : text and mask before the cursor, where
+    characters are appended, and after it, both left untouched"""
+
+    def __init__(self, line, text, vis, char):
+        self.line = line
+        self.before = text[:char]
+        self.after = text[char:]
+        self.visBefore = vis[:char]
+        self.visAfter = vis[char:]
+        self.shown = sum(self.visBefore) # Visible characters before gap
+        self.typed = []
+        self.mask = bytearray()
+        self.count = 0 # Visible typed characters
+        self.last = -1 # Last visible typed character
+
+    def end(self):
+        """position of the gap, in line"""
+        return len(self.before) + len(self.typed)
+
+    def insert(self, text):
+        self.typed += text
+        self.mask += b"\x01" * len(text)
+        self.count += len(text)
+        self.last = len(self.typed) - 1
+
+    def hideLast(self):
+        """hide last visible character before gap, if it was typed, follows
+        another visible character, and the gap is before a visible one"""
+        if self.last == -1 or self.shown + self.count < 2 or \
+           self.visAfter[:1] != b"\x01":
+            return False
+        self.mask[self.last] = 0
+        self.count -= 1
+        self.last = self.mask.rfind(1, 0, self.last)
+        return True
+
+    def text(self):
+        return self.before + "".join(self.typed) + self.after
+
+    def vis(self):
+        return self.visBefore + self.mask + self.visAfter
+
+class Engine():
+    """editing state and commands, without a terminal
+    Redraw hooks (changed, display) do nothing here."""
     line = 0
     char = 0
     displine = 0
@@ -22,30 +200,87 @@ class Editor():
     filename = False
     cutbuffer = []
     cutting = 0
+    journal = None
+    gap = None # Line being typed into
+    visCounts = None # Counts of last line which needed them
+    pasting = False # Inside a bracketed paste, until its end marker
+    held = () # Keys held back from the last batch, maybe part of a marker
+    message = "" # Shown on the status bar, until the next keys
 
-    def updateCursor(self):
-        wh, ww = self.stdscr.getmaxyx()
-        if self.line + VOFF >= wh:
-            # TODO whaat
-            return
-        if self.dispchar + HOFF >= ww:
-            # TODO whhaat
-            return
-        self.stdscr.move(self.line + VOFF, self.dispchar + HOFF)
+    @property
+    def text(self):
+        """lines (closing the line being typed into)"""
+        if self.gap:
+            self.flush()
+        return self._text
+
+    @text.setter
+    def text(self, lines):
+        self.gap = None
+        self._text = lines
+
+    @property
+    def vis(self):
+        """visibility masks of lines (closing the line being typed into)"""
+        if self.gap:
+            self.flush()
+        return self._vis
+
+    @vis.setter
+    def vis(self, masks):
+        self.gap = None
+        self._vis = masks
+
+    def flush(self):
+        """write the line being typed into back to text and masks"""
+        gap = self.gap
+        self.gap = None
+        self._text[gap.line] = gap.text()
+        self._vis[gap.line] = gap.vis()
+
+    def lineAt(self, ln):
+        """text and mask of line ln, leaving the line being typed into open"""
+        if self.gap and self.gap.line == ln:
+            return self.gap.text(), self.gap.vis()
+        return self._text[ln], self._vis[ln]
+
+    def changed(self, start, stop=None):
+        """lines [start, stop[ changed (up to the end if stop is None)"""
+        pass
+
+    def display(self):
+        pass
+
+    def counts(self, ln):
+        """visibility counts of line ln (rebuilt once its mask is replaced
+        or resized, in place changes must go through hideChar)"""
+        vis = self.vis[ln]
+        counts = self.visCounts
+        if counts is None or counts.mask is not vis or \
+           counts.size != len(vis):
+            counts = self.visCounts = VisCounts(vis)
+        return counts
+
+    def hideChar(self):
+        """hide character at cursor"""
+        self.counts(self.line).hide(self.char)
 
     def setChar(self, userchar):
-        ndispc = nc = 0
-        for v in self.vis[self.line][:-1]:
-            if v and nc >= userchar:
-                break
-            if self.showHidden or v:
-                ndispc += 1
-            nc += 1
+        counts = self.counts(self.line)
+        last = counts.size - 1
+        if self.showHidden:
+            # first visible character from userchar on
+            k = counts.before(min(userchar, last))
+            nc = counts.select(k) if k < counts.total else last
+            ndispc = nc = min(nc, last)
+        else:
+            ndispc = max(0, min(userchar, counts.before(last)))
+            nc = counts.select(ndispc) if ndispc < counts.before(last) \
+                 else last
         self.char = nc
         if ndispc == userchar:
             self.userchar = userchar
         self.dispchar = ndispc
-        self.updateCursor()
 
     def setLine(self, line):
         if 0 <= line:
@@ -61,54 +296,51 @@ class Editor():
 
     def incChar(self):
         while True:
-            self.char += 1
-            if self.char == len(self.vis[self.line]):
-                # EOL
-                if self.line + 1 == len(self.text):
-                    # EOF
-                    self.char -= 1
-                    break
-                self.line += 1
-                self.char = 0
-                self.dispchar = -1
-            VIS = self.vis[self.line][self.char]
-            if VIS or self.showHidden:
-                self.dispchar += 1
-            if VIS:
+            counts = self.counts(self.line)
+            k = counts.before(self.char + 1)
+            if k < counts.total:
+                # next visible character
+                nc = counts.select(k)
+                self.dispchar += nc - self.char if self.showHidden else 1
+                self.char = nc
+                break
+            if self.line + 1 == len(self.text):
+                # EOF
+                if self.showHidden:
+                    self.dispchar += counts.size - 1 - self.char
+                self.char = counts.size - 1
                 break
+            self.line += 1
+            self.char = -1
+            self.dispchar = -1
         self.userchar = self.dispchar
-        self.updateCursor()
 
     def decChar(self):
         while True:
-            self.char -= 1
-            if self.char == - 1:
-                if self.line == 0:
-                    self.dispchar = -1
-                    self.incChar()
-                    break
-                self.line -= 1
-                self.char = len(self.vis[self.line]) - 1
-                if self.showHidden:
-                    self.dispchar = self.char + 1
-                else:
-                    self.dispchar = sum(self.vis[self.line])
-            VIS = self.vis[self.line][self.char]
-            if VIS or self.showHidden:
-                self.dispchar -= 1
-            if VIS:
+            counts = self.counts(self.line)
+            k = counts.before(self.char)
+            if k > 0:
+                # previous visible character
+                nc = counts.select(k - 1)
+                self.dispchar -= self.char - nc if self.showHidden else 1
+                self.char = nc
+                break
+            if self.line == 0:
+                self.char = self.dispchar = -1
+                self.incChar()
                 break
+            self.line -= 1
+            counts = self.counts(self.line)
+            self.char = counts.size
+            if self.showHidden:
+                self.dispchar = counts.size
+            else:
+                self.dispchar = counts.total
         self.userchar = self.dispchar
-        self.updateCursor()
 
     def hide(self):
         self.showHidden = False
-        self.dispchar = 0
-        for nc, v in enumerate(self.vis[self.line]):
-            if v:
-                if nc >= self.char:
-                    break
-                self.dispchar += 1
+        self.dispchar = self.counts(self.line).before(self.char)
         self.userchar = self.dispchar
 
     def reveal(self):
@@ -121,24 +353,59 @@ class Editor():
         else:
             self.reveal()
 
-    def __init__(self, stdscr, text=["\n"], vis=None, line=0, char=0):
-        self.stdscr = stdscr
+    def __init__(self, text=None, vis=None, line=0, char=0):
         # TODO modified = False
-        self.text = text
+        self.text = text or ["\n"]
         # TODO check newlines
-        self.vis = vis or [[True for c in line] for line in text]
+        self.vis = vis or [mask(line) for line in self.text]
         self.setLine(line)
         self.setChar(char)
 
-    def type(self, c):
-        self.text[self.line] = "{}{}{}".format(
-            self.text[self.line][:self.char], c,
-            self.text[self.line][self.char:])
-        self.vis[self.line].insert(self.char, True)
-        self.char += 1
-        self.dispchar += 1
+    def persist(self, fn):
+        """keep text in journal fn, starting from its content"""
+        journal = Journal(fn, encodeLine, decodeLine,
+                          lambda: (list(zip(self.text, self.vis)), []))
+        state = journal.load()
+        if state is not None and len(state[0]) > 0:
+            self.text = [text for text, vis in state[0]]
+            self.vis = [vis for text, vis in state[0]]
+            self.setLine(0)
+        journal.start(state is not None)
+        self.journal = journal
+
+    def record(self, start, stop, count):
+        """lines [start, stop[ were replaced with count lines : journal
+        them, and have them redrawn (with following lines if they moved)"""
+        if count == stop - start:
+            self.changed(start, stop)
+        else:
+            self.changed(start)
+        if self.journal:
+            self.journal.splice(start, stop,
+                [self.lineAt(ln) for ln in range(start, start+count)])
+
+    def type(self, text):
+        """type text (a character or more, without newlines) at cursor"""
+        if len(text) == 0:
+            return
+        gap = self.gap
+        if not gap or gap.line != self.line or gap.end() != self.char:
+            gap = GapLine(self.line, self.text[self.line],
+                          self.vis[self.line], self.char)
+            self.gap = gap
+        gap.insert(text)
+        self.record(self.line, self.line+1, 1)
+        self.char += len(text)
+        self.dispchar += len(text)
         self.userchar = self.dispchar
-        self.displayLine()
+
+    def paste(self, text):
+        """type text, breaking lines at its newlines"""
+        for n, line in enumerate(text.replace("\r\n", "\n")
+                                     .replace("\r", "\n").split("\n")):
+            if n > 0:
+                self.newline()
+            self.type(line)
 
     def newline(self):
         ln = self.line
@@ -146,18 +413,28 @@ class Editor():
         vis = self.vis[ln]
         ch = self.char
         self.text[ln:ln+1] = [text[:ch] + "\n", text[ch:]]
-        self.vis[ln:ln+1] = [vis[:ch] + [True], vis[ch:]]
+        self.vis[ln:ln+1] = [vis[:ch] + b"\x01", vis[ch:]]
+        self.record(ln, ln+1, 2)
         self.line += 1
         self.userchar = self.dispchar = self.char = 0
-        self.display()
 
     def backspace(self):
-        if sum(self.vis[self.line][:self.char]) == 0:
+        gap = self.gap
+        if gap and gap.line == self.line and gap.end() == self.char and \
+           gap.hideLast():
+            # cursor stays before the same character
+            if not self.showHidden:
+                self.dispchar -= 1
+            self.userchar = self.dispchar
+            self.record(self.line, self.line+1, 1)
+            return
+        before = self.counts(self.line).before(self.char)
+        if before == 0:
             if self.line == 0:
                 return
             self.decChar()
-            self.vis[self.line][self.char] = False
-            if sum(self.vis[self.line][:self.char]) < 1:
+            self.hideChar()
+            if self.counts(self.line).before(self.char) < 1:
                 self.dispchar = self.char = -1
             else:
                 self.decChar()
@@ -165,23 +442,23 @@ class Editor():
             del self.text[self.line+1]
             self.vis[self.line] += self.vis[self.line+1]
             del self.vis[self.line+1]
+            self.record(self.line, self.line+2, 1)
             self.incChar()
-            self.display()
-        elif sum(self.vis[self.line][:self.char]) == 1:
+        elif before == 1:
             self.decChar()
-            self.vis[self.line][self.char] = False
+            self.hideChar()
+            self.record(self.line, self.line+1, 1)
             self.dispchar = self.char = -1
             self.incChar()
-            self.displayLine()
         else:
             self.decChar()
-            self.vis[self.line][self.char] = False
+            self.hideChar()
+            self.record(self.line, self.line+1, 1)
             self.decChar()
             self.incChar()
-            self.displayLine()
 
     def getVisible(self, ln):
-        return "".join(map(cvToChar, zip(self.text[ln], self.vis[ln])))
+        return "".join(itertools.compress(*self.lineAt(ln)))
 
     def cut(self):
         if self.cutting == 1:
@@ -191,12 +468,13 @@ class Editor():
         else:
             self.cutbuffer = [self.getVisible(self.line)]
             self.cutting = 1
-        self.vis[self.line] = [False for n in self.text[self.line]]
+        self.vis[self.line] = mask(self.text[self.line], 0)
         if self.line + 1 < len(self.text):
             self.text[self.line] += self.text[self.line+1]
             del self.text[self.line+1]
             self.vis[self.line] += self.vis[self.line+1]
             del self.vis[self.line+1]
+            self.record(self.line, self.line+2, 1)
             self.char = len(self.text[self.line]) - 1
             if self.showHidden:
                 self.dispchar = self.char
@@ -204,53 +482,314 @@ class Editor():
                 self.dispchar = 0
             self.incChar()
         else:
-            self.vis[self.line][-1] = True
+            self.vis[self.line][-1] = 1
             if self.line > 0:
                 self.text[self.line-1] += self.text[self.line]
                 del self.text[self.line]
-                self.vis[self.line-1][-1] = False
+                self.vis[self.line-1][-1] = 0
                 self.vis[self.line-1] += self.vis[self.line]
                 del self.vis[self.line]
+                self.record(self.line-1, self.line+1, 1)
                 self.line -= 1
+            else:
+                self.record(self.line, self.line+1, 1)
             self.char = len(self.text[self.line]) - 1
             if self.showHidden:
                 self.dispchar = self.char
             else:
                 self.dispchar = sum(self.vis[self.line]) - 1
-        self.display()
 
     def uncut(self):
         self.text[self.line:self.line] = self.cutbuffer
         self.vis[self.line:self.line] = \
-            [[True for c in line] for line in self.cutbuffer]
+            [mask(line) for line in self.cutbuffer]
+        self.record(self.line, self.line, len(self.cutbuffer))
         self.line += len(self.cutbuffer)
         self.userchar = self.dispchar = self.char = 0
-        self.display()
 
-    def displayline(self, ln):
-        wh, ww = self.stdscr.getmaxyx()
-        #self.stdscr.addstr(ln + VOFF, 0, "{:3d}".format(ln))
-        vcn = 0
-        for cn, c in enumerate(self.text[ln][:-1]):
-            if vcn + HOFF == ww:
+    def load(self, fn):
+        """edit file fn : a document saved with its hidden text, or text
+        (a new file is only created once saved), reporting files which
+        cannot be read in message, and leaving the text as it was"""
+        self.filename = fn
+        try:
+            with open(fn, newline="", encoding="utf-8") as f:
+                if f.read(len(MAGIC)) == MAGIC:
+                    f.seek(0)
+                    lines = Document.read(f).masks()
+                    self.text = [text for text, vis in lines]
+                    self.vis = [vis for text, vis in lines]
+                else:
+                    f.seek(0)
+                    lines = f.read().split("\n")
+                    text = [line + "\n" for line in lines[:-1]]
+                    if lines[-1]:
+                        text.append(lines[-1] + "\n")
+                    self.text = text
+                    self.vis = [mask(line) for line in text]
+        except FileNotFoundError:
+            return
+        except OSError:
+            self.message = "Cannot open {}".format(fn)
+        except UnicodeDecodeError:
+            self.message = "Cannot decode {} (not UTF-8)".format(fn)
+        except ValueError:
+            self.message = "Invalid nohide document {}".format(fn)
+        if self.message:
+            # not to overwrite fn on ^O
+            self.filename = False
+            return
+        if len(self.text) == 0:
+            self.text, self.vis = ["\n"], [mask("\n")]
+        self.setLine(0)
+
+    def save(self):
+        """write text to filename (with its hidden text if showing it)"""
+        with open(self.filename, "w", buffering=BLOCK, newline="",
+                  encoding="utf-8") as f:
+            if self.showHidden:
+                writeLines(f, zip(self.text, self.vis))
+            else:
+                for n in range(len(self.text)):
+                    f.write(self.getVisible(n))
+
+    def write(self):
+        if self.filename:
+            self.save()
+
+    def handleKey(self, c):
+        """apply key c (as curses getkey names it), False once quitting"""
+        if c not in [CUT, "KEY_RESIZE"]:
+            self.cutting = 0
+        if c == "KEY_RESIZE":
+            self.display()
+        elif c == TOGGLE:
+            self.toggleHidden()
+            self.changed(0)
+        elif c == WRITE:
+            self.write()
+        elif c == DEBUG:
+            # drawn by the terminal front end
+            pass
+        elif c == INTERRUPT:
+            # TODO display cursor position
+            # need to stop raising KeyboardInterrupt
+            pass
+        elif c == EXIT:
+            # TODO check file modified
+            return False
+        elif c == CUT:
+            self.cut()
+        elif c == UNCUT:
+            self.uncut()
+        elif c == "KEY_RIGHT": self.incChar()
+        elif c == "KEY_LEFT":  self.decChar()
+        elif c == "KEY_UP":    self.setLine(self.line - 1)
+        elif c == "KEY_DOWN":  self.setLine(self.line + 1)
+        elif c in [BACKSPACE, "KEY_BACKSPACE"]:
+            self.backspace()
+        elif c == "\n":
+            self.newline()
+        elif len(c) == 1:
+            self.type(c)
+        return True
+
+    def handleKeys(self, keys):
+        """apply keys, typing runs of characters and bracketed pastes at
+        once, False once quitting
+        A paste, or its markers, may be split across batches : the end
+        of a batch which may start a marker is held until the next one."""
+        keys = list(self.held) + list(keys)
+        self.held = ()
+        n = 0
+        while n < len(keys):
+            c = keys[n]
+            if self.pasting:
+                start = n
+                while n < len(keys):
+                    if keys[n] == PASTE_END[0]:
+                        marker = "".join(keys[n:n+len(PASTE_END)])
+                        if PASTE_END.startswith(marker):
+                            # end marker, or its start at end of batch
+                            break
+                    n += 1
+                text = "".join(keys[start:n])
+                if "".join(keys[n:n+len(PASTE_END)]) == PASTE_END:
+                    self.pasting = False
+                    n += len(PASTE_END)
+                else:
+                    # end of batch, keep a final "\r" for a "\n" after it
+                    self.held = keys[n:]
+                    if text.endswith("\r"):
+                        text = text[:-1]
+                        self.held.insert(0, "\r")
+                    n = len(keys)
+                self.cutting = 0
+                self.paste(text)
+            elif c == PASTE_START[0] and \
+                 len(keys) - n < len(PASTE_START) and \
+                 PASTE_START.startswith("".join(keys[n:])):
+                # maybe the start of a paste marker, wait for the rest
+                self.held = keys[n:]
                 break
-            if self.vis[ln][cn]:
-                self.stdscr.addch(ln + VOFF, vcn + HOFF, c)
-                vcn += 1
-            elif self.showHidden:
-                if c == "\n":
-                    c = "↵"
-                self.stdscr.attron(curses.color_pair(2))
-                self.stdscr.addch(ln + VOFF, vcn + HOFF, c)
-                self.stdscr.attroff(curses.color_pair(2))
-                vcn += 1
+            elif c == PASTE_START[0] and \
+                 "".join(keys[n:n+len(PASTE_START)]) == PASTE_START:
+                self.pasting = True
+                n += len(PASTE_START)
+            elif len(c) == 1 and c.isprintable():
+                start = n
+                while n < len(keys) and len(keys[n]) == 1 and \
+                      keys[n].isprintable():
+                    n += 1
+                self.cutting = 0
+                self.type("".join(keys[start:n]))
+            else:
+                if not self.handleKey(c):
+                    return False
+                n += 1
+        return True
+
+class Editor(Engine):
+    """Engine drawn on a curses screen, through a viewport of its lines"""
+    top = 0 # First line on screen
+    left = 0 # First column on screen
+
+    def __init__(self, stdscr, *args, **kwargs):
+        self.stdscr = stdscr
+        self.dirty = set() # Lines to redraw
+        self.dirtyFrom = None # Line from which to redraw everything
+        self.bars = True # Whether to redraw bars
+        super().__init__(*args, **kwargs)
+
+    def rows(self):
+        """number of lines on screen, between title and status bar"""
+        wh, ww = self.stdscr.getmaxyx()
+        return max(1, wh - VOFF - 3)
+
+    def columns(self):
+        wh, ww = self.stdscr.getmaxyx()
+        return max(1, ww - HOFF)
+
+    def follow(self):
+        """move viewport over cursor, return whether columns moved and
+        by how many lines it scrolled"""
+        rows = self.rows()
+        delta = 0
+        if self.line < self.top:
+            delta = self.line - self.top
+        elif self.line >= self.top + rows:
+            delta = self.line - rows + 1 - self.top
+        self.top += delta
+        columns = self.columns()
+        if self.left <= self.dispchar < self.left + columns:
+            return False, delta
+        self.left = max(0, self.dispchar - columns // 2)
+        return True, delta
+
+    def scroll(self):
+        """keep cursor on screen, moving what is already drawn if possible,
+        and mark lines left to draw"""
+        moved, delta = self.follow()
+        rows = self.rows()
+        if moved or abs(delta) >= rows:
+            self.changed(self.top)
+        elif delta:
+            wh, ww = self.stdscr.getmaxyx()
+            self.stdscr.setscrreg(VOFF, VOFF + rows - 1)
+            self.stdscr.scrollok(True)
+            self.stdscr.scroll(delta)
+            self.stdscr.scrollok(False)
+            self.stdscr.setscrreg(0, wh - 1)
+            if delta > 0:
+                self.changed(self.top + rows - delta, self.top + rows)
+            else:
+                self.changed(self.top, self.top - delta)
+
+    def changed(self, start, stop=None):
+        if stop is not None:
+            self.dirty.update(range(start, stop))
+        elif self.dirtyFrom is None or start < self.dirtyFrom:
+            self.dirtyFrom = start
+
+    def refresh(self):
+        """draw damaged bars and lines, place cursor, and flush it all
+        to the terminal at once"""
+        if self.bars:
+            self.displayBars()
+            self.bars = False
+        self.scroll()
+        top, bottom = self.top, self.top + self.rows()
+        if self.dirtyFrom is not None and self.dirtyFrom < bottom:
+            self.dirty.update(range(max(top, self.dirtyFrom), bottom))
+        for ln in sorted(self.dirty):
+            if top <= ln < bottom:
+                self.displayRow(ln)
+        self.dirty = set()
+        self.dirtyFrom = None
+        self.stdscr.move(self.line - self.top + VOFF,
+                         self.dispchar - self.left + HOFF)
+        self.stdscr.refresh()
+
+    def displayline(self, ln):
+        """draw line ln, if it is on screen, one run of equal attributes
+        at a time"""
+        if not self.top <= ln < self.top + self.rows():
+            return
+        row = ln - self.top + VOFF
+        text, vis = self.lineAt(ln)
+        text = text[:-1]
+        if not self.showHidden:
+            text = "".join(itertools.compress(text, vis))
+            text = text[self.left:self.left + self.columns()]
+            if text:
+                self.stdscr.addstr(row, HOFF, text)
+            return
+        left, right = self.left, self.left + self.columns()
+        start = 0
+        while start < min(len(text), right):
+            shown = vis[start]
+            end = vis.find(b"\x00" if shown else b"\x01", start, len(text))
+            if end == -1:
+                end = len(text)
+            if end > left:
+                run = text[max(start, left):min(end, right)]
+                if shown:
+                    self.stdscr.addstr(row, max(start, left) - left + HOFF,
+                                       run)
+                else:
+                    self.stdscr.addstr(row, max(start, left) - left + HOFF,
+                                       run.replace("\n", "↵"),
+                                       self.hiddenAttr())
+            start = end
+
+    def hiddenAttr(self):
+        return curses.color_pair(2)
+
+    def displayRow(self, ln):
+        """clear the screen row of line ln, and draw the line if any"""
+        self.stdscr.move(ln - self.top + VOFF, 0)
+        self.stdscr.clrtoeol()
+        if ln < len(self._text):
+            self.displayline(ln)
 
     def display(self):
+        """have everything redrawn, from a blank screen"""
         self.stdscr.clear()
+        self.bars = True
+        self.changed(self.top)
+
+    def displayBars(self):
+        """draw title, status and command bars"""
+        wh, ww = self.stdscr.getmaxyx()
+        self.stdscr.move(wh-3, 0)
+        self.stdscr.clrtoeol()
         self.stdscr.addstr(
             0, 0, "  NoHide nano", curses.A_REVERSE)
         self.stdscr.chgat(curses.A_REVERSE)
-        wh, ww = self.stdscr.getmaxyx()
+        if self.message:
+            message = "[ {} ]".format(self.message)[:ww]
+            self.stdscr.addstr(wh-3, max(0, (ww - len(message)) // 2),
+                               message, curses.A_REVERSE)
         for n in range(0, len(commands), 2):
             if (n+1)*10 > ww:
                 break
@@ -262,15 +801,13 @@ class Editor():
             c = commands[n+1].split(" ", 1)
             self.stdscr.addstr(wh-1, n*10, c[0], curses.A_REVERSE)
             self.stdscr.addstr(" " + c[1])
-        for ln in range(len(self.text)):
-            self.displayline(ln)
-        self.updateCursor()
 
-    def displayLine(self):
-        self.stdscr.move(self.line + VOFF, 0)
-        self.stdscr.clrtoeol()
-        self.displayline(self.line)
-        self.updateCursor()
+    def handleKeys(self, keys):
+        if self.message:
+            # shown until now
+            self.message = ""
+            self.bars = True
+        return super().handleKeys(keys)
 
     def write(self):
         if not self.filename:
@@ -280,80 +817,74 @@ class Editor():
             self.stdscr.attron(curses.A_REVERSE)
             self.stdscr.addstr("File Name to Write ")
             if self.showHidden:
-                self.stdscr.addstr("(plaintext) : ")
-            else:
                 self.stdscr.addstr("(fulltext) : ")
+            else:
+                self.stdscr.addstr("(plaintext) : ")
             curses.echo()
             self.filename = self.stdscr.getstr()
             # TODO catch commands, incl. ^C
             curses.noecho()
             self.stdscr.attroff(curses.A_REVERSE)
-        with open(self.filename, "w") as f:
-            if self.showHidden:
-                for n, line in enumerate(self.text):
-                    f.write(line)
-                    f.write("".join([str(v+0) for v in self.vis[n]])+"\n")
-            else:
-                for n in range(len(self.text)):
-                    f.write(self.visible(n))
-        self.display()
+        self.save()
+        self.bars = True
+
+def replayMain(fn):
+    """replay key log or asciinema cast fn without a terminal, print the
+    resulting visible text, and the time per key on stderr"""
+    with open(fn) as f:
+        if fn.endswith(".cast"):
+            data = "".join(castInput(f))
+        else:
+            data = f.read()
+    start = time.perf_counter()
+    e, count = replay(data)
+    elapsed = time.perf_counter() - start
+    for n in range(len(e.text)):
+        sys.stdout.write(e.getVisible(n))
+    sys.stderr.write("{} keys in {:.3f}s ({:.1f}us/key)\n".format(
+        count, elapsed, elapsed / max(1, count) * 1e6))
 
 commands = [
-    " Exit",
-    " Write Out",
-    " Toggle Hidden",
-    " Toggle Debug",
-    " Cut Text",
-    " Uncut Text"
+    "^X Exit",
+    "^O Write Out",
+    "^V Toggle Hidden",
+    "^D Toggle Debug",
+    "^K Cut Text",
+    "^U Uncut Text"
 ]
 
 def main(stdscr):
     stdscr.clear()
+    stdscr.idlok(True)
     curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)
     e = Editor(stdscr, ["\n"])
+    args = sys.argv[1:]
+    journal = None
+    if len(args) > 1 and args[0] == "-j":
+        journal = args[1]
+        args = args[2:]
+    if args:
+        e.load(args[0])
+    if journal:
+        e.persist(journal)
     debug = False
-    e.display()
-    stdscr.refresh()
+    sys.stdout.write(PASTE_ON)
+    sys.stdout.flush()
+    e.refresh()
     while True:
         try:
-            c = stdscr.getkey()
-            if c not in ["", "KEY_RESIZE"]:
-                e.cutting = 0
-            if c == "KEY_RESIZE":
-                e.display()
-            elif c == "":
-                e.toggleHidden()
-                stdscr.clear()
-                e.display()
-            elif c == "":
+            # apply keys typed or pasted meanwhile at once, then redraw
+            batch = [stdscr.getkey()] + pending(stdscr)
+            c = batch[-1]
+            if not e.handleKeys(batch):
+                break
+            if DEBUG in batch:
                 debug = not debug
                 stdscr.addstr(0, 20, "[{}]".format(c))
                 e.display()
-            elif c == "":
-                e.write()
-            elif c == "":
-                # TODO display cursor position
-                # need to stop raising KeyboardInterrupt
-                pass
-            elif c == "":
-                # TODO check file modified
-                break
-            elif c == "":
-                e.cut()
-            elif c == "":
-                stdscr.addstr(1, 40, "^U")
-                e.uncut()
-            elif c == "KEY_RIGHT": e.incChar()
-            elif c == "KEY_LEFT":  e.decChar()
-            elif c == "KEY_UP":    e.setLine(e.line - 1)
-            elif c == "KEY_DOWN":  e.setLine(e.line + 1)
-            elif c in ["", "KEY_BACKSPACE"]:
-                e.backspace()
-            elif c == "\n":
-                e.newline()
-            elif len(c) == 1:
-                e.type(c)
             if debug:
+                # draw damage first, not to cover debug information
+                e.refresh()
                 stdscr.addstr(0, 15, str(curses.COLORS))
                 stdscr.addstr(0, 20, "[{}]".format(c))
                 stdscr.clrtoeol()
@@ -362,9 +893,14 @@ def main(stdscr):
                         e.char, e.dispchar, e.userchar))
                 stdscr.clrtoeol()
                 stdscr.chgat(curses.A_REVERSE)
-                e.updateCursor()
-            stdscr.refresh()
+            e.refresh()
         except KeyboardInterrupt:
             break
+    sys.stdout.write(PASTE_OFF)
+    sys.stdout.flush()
 
-curses.wrapper(main)
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "-R":
+        replayMain(sys.argv[2])
+    else:
+        curses.wrapper(main)
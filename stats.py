@@ -0,0 +1,87 @@
+"""per command statistics of an ed session
+
+For each command letter : how many times it ran, its latencies (total
+and percentiles), lines it touched (replaced or inserted) and memory
+it left allocated, as tracemalloc counts it. Commands run by glob are
+counted by themselves, and in glob's own figures.
+"""
+
+import json
+import time
+import tracemalloc
+from array import array
+
+# Percentiles reported
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(times, p):
+    """nearest rank p-th percentile of sorted times"""
+    return times[max(0, -(-len(times) * p // 100) - 1)]
+
+
+class CommandStats:
+    """figures per command letter, tracing memory if memory is set"""
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.touched = 0 # Lines touched so far, updated by the editor
+        self.commands = {}
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def measure(self, op, run, *args):
+        """call run(*args) as command op, and record it"""
+        touched = self.touched
+        allocated = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        start = time.perf_counter()
+        try:
+            return run(*args)
+        finally:
+            seconds = time.perf_counter() - start
+            if self.memory:
+                allocated = tracemalloc.get_traced_memory()[0] - allocated
+            self.record(op, seconds, self.touched - touched, allocated)
+
+    def record(self, op, seconds, lines, allocated):
+        entry = self.commands.get(op)
+        if entry is None:
+            entry = self.commands[op] = {
+                "count": 0, "lines": 0, "allocated": 0, "times": array("d")}
+        entry["count"] += 1
+        entry["lines"] += lines
+        entry["allocated"] += allocated
+        entry["times"].append(seconds)
+
+    def summary(self):
+        """figures per command letter, times in seconds"""
+        summary = {}
+        for op, entry in sorted(self.commands.items()):
+            times = sorted(entry["times"])
+            figures = {
+                "count": entry["count"],
+                "total": sum(times),
+                "lines": entry["lines"],
+                "allocated": entry["allocated"],
+            }
+            for p in PERCENTILES:
+                figures["p{}".format(p)] = percentile(times, p)
+            figures["max"] = times[-1]
+            summary[op] = figures
+        return summary
+
+    def report(self):
+        """summary as table lines, times in milliseconds"""
+        yield "{:>4} {:>8} {:>10} {:>9} {:>9} {:>9} {:>9} {:>10}\n".format(
+            "cmd", "count", "total", "p50", "p90", "p99", "lines", "alloc")
+        for op, f in self.summary().items():
+            yield ("{:>4} {:8} {:10.3f} {:9.3f} {:9.3f} {:9.3f} {:9} "
+                   "{:10}\n").format(op or "\\n", f["count"], f["total"] * 1e3,
+                                    f["p50"] * 1e3, f["p90"] * 1e3,
+                                    f["p99"] * 1e3, f["lines"],
+                                    f["allocated"])
+
+    def dump(self, fn):
+        """write summary to fn as JSON"""
+        with open(fn, "w") as f:
+            json.dump(self.summary(), f, indent=1)
@@ -0,0 +1,239 @@
+"""line stores for the ed buffer
+
+A store behaves like the plain list ed keeps its lines in :
+integer and slice indexing, slice assignment, iteration, len,
+comparison and repr work the same, so either can be plugged in.
+"""
+
+import mmap
+import itertools
+
+# Preferred number of lines per chunk
+CHUNK = 512
+# Preferred number of bytes per chunk of a mapped file
+CHUNKBYTES = 1 << 16
+
+
+def iterate(lines, start, stop):
+    """lines[start:stop] of a store, without copying them"""
+    if isinstance(lines, RopeStore):
+        return lines.iterate(start, stop)
+    return itertools.islice(lines, start, stop)
+
+
+class FileChunk:
+    """lines of a mapped file, checked to be UTF-8 but only decoded
+    into lines once needed"""
+
+    def __init__(self, mm, start, end, makeLine):
+        self.mm = mm
+        self.start = start
+        self.end = end
+        self.makeLine = makeLine
+        raw = mm[start:end]
+        raw.decode() # Fail now rather than once accessed
+        self.count = raw.count(b"\n") + (raw[-1:] != b"\n")
+
+    def __len__(self):
+        return self.count
+
+    def bytes(self):
+        """raw content, with final newline"""
+        raw = self.mm[self.start:self.end]
+        if raw[-1:] != b"\n":
+            raw += b"\n"
+        return raw
+
+    def load(self):
+        lines = self.bytes().decode().split("\n")[:-1]
+        return list(map(self.makeLine, lines))
+
+
+class RopeStore:
+    """lines kept in chunks, located through a fenwick tree of chunk sizes
+
+    Finding a line costs O(log chunks), editing a line range costs
+    O(log chunks + CHUNK + range); the index is only rebuilt when
+    chunks are split, merged or dropped."""
+
+    def __init__(self, lines=()):
+        lines = list(lines)
+        self.chunks = [lines[n:n+CHUNK] for n in range(0, len(lines), CHUNK)]
+        self.reindex()
+
+    @classmethod
+    def fromFile(cls, f, makeLine):
+        """store of lines of file f, each built by makeLine from a string
+        Chunks are mapped, and only decoded once accessed."""
+        store = cls()
+        size = f.seek(0, 2)
+        if size == 0:
+            return store
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start = 0
+        while start < size:
+            end = mm.find(b"\n", min(start + CHUNKBYTES, size) - 1) + 1
+            if end == 0:
+                end = size
+            store.chunks.append(FileChunk(mm, start, end, makeLine))
+            start = end
+        store.reindex()
+        return store
+
+    def chunk(self, c):
+        """chunk c, as a list of lines"""
+        chunk = self.chunks[c]
+        if type(chunk) is not list:
+            chunk = self.chunks[c] = chunk.load()
+        return chunk
+
+    def reindex(self):
+        """rebuild fenwick tree over chunk lengths"""
+        tree = [0] * (len(self.chunks) + 1)
+        for n, chunk in enumerate(self.chunks, 1):
+            tree[n] += len(chunk)
+            parent = n + (n & -n)
+            if parent < len(tree):
+                tree[parent] += tree[n]
+        self.tree = tree
+        self.top = 1
+        while self.top * 2 < len(tree):
+            self.top *= 2
+        self.size = sum(map(len, self.chunks))
+
+    def resize(self, c, inc):
+        """add inc to the length of chunk c"""
+        self.size += inc
+        c += 1
+        while c < len(self.tree):
+            self.tree[c] += inc
+            c += c & -c
+
+    def locate(self, i):
+        """chunk holding line i (0 <= i < len), and offset inside it"""
+        c = 0
+        step = self.top
+        while step:
+            if c + step < len(self.tree) and self.tree[c+step] <= i:
+                c += step
+                i -= self.tree[c]
+            step >>= 1
+        return c, i
+
+    def index(self, i):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("store index out of range")
+        return i
+
+    def bounds(self, s):
+        start, stop, step = s.indices(self.size)
+        if step != 1:
+            raise ValueError("store slices cannot have a step")
+        return start, max(start, stop)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for c in range(len(self.chunks)):
+            yield from self.chunk(c)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.slice(*self.bounds(i))
+        c, o = self.locate(self.index(i))
+        return self.chunk(c)[o]
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            self.splice(*self.bounds(i), value)
+        else:
+            c, o = self.locate(self.index(i))
+            self.chunk(c)[o] = value
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            self.splice(*self.bounds(i), [])
+        else:
+            i = self.index(i)
+            self.splice(i, i+1, [])
+
+    def iterate(self, start, stop):
+        if start >= stop:
+            return
+        c, o = self.locate(start)
+        while stop > start:
+            chunk = self.chunk(c)[o:o+stop-start]
+            yield from chunk
+            start += len(chunk)
+            c, o = c + 1, 0
+
+    def slice(self, start, stop):
+        lines = []
+        if start >= stop:
+            return lines
+        c, o = self.locate(start)
+        while len(lines) < stop - start:
+            lines.extend(self.chunk(c)[o:o+stop-start-len(lines)])
+            c, o = c + 1, 0
+        return lines
+
+    def splice(self, start, stop, lines):
+        """replace lines [start, stop[ with lines"""
+        lines = list(lines)
+        if len(self.chunks) == 0:
+            self.chunks = [lines[n:n+CHUNK]
+                           for n in range(0, len(lines), CHUNK)]
+            self.reindex()
+            return
+        if start == self.size:
+            c, o = len(self.chunks) - 1, len(self.chunks[-1])
+        else:
+            c, o = self.locate(start)
+        chunk = self.chunk(c)
+        if o + stop - start <= len(chunk):
+            # edit inside a single chunk
+            chunk[o:o+stop-start] = lines
+            self.resize(c, len(lines) - (stop - start))
+            if CHUNK // 4 <= len(chunk) <= 2 * CHUNK:
+                return
+            last = c
+        else:
+            # gather every chunk touched by the range
+            last, end = self.locate(stop - 1)
+            chunk = chunk[:o] + lines + self.chunk(last)[end+1:]
+        if len(chunk) < CHUNK // 4 and last + 1 < len(self.chunks):
+            # too small, merge with next chunk
+            last += 1
+            chunk = chunk + self.chunk(last)
+        if len(chunk) > 2 * CHUNK:
+            chunk = [chunk[n:n+CHUNK] for n in range(0, len(chunk), CHUNK)]
+        else:
+            chunk = [chunk] if chunk else []
+        self.chunks[c:last+1] = chunk
+        self.reindex()
+
+    def insert(self, i, line):
+        i = min(max(0, i + self.size if i < 0 else i), self.size)
+        self.splice(i, i, [line])
+
+    def append(self, line):
+        self.splice(self.size, self.size, [line])
+
+    def extend(self, lines):
+        self.splice(self.size, self.size, lines)
+
+    def __eq__(self, other):
+        try:
+            if len(self) != len(other):
+                return False
+        except TypeError:
+            return NotImplemented
+        return all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""time ed and nano hot paths on large synthetic buffers
+
+Every operation runs on a fresh buffer of each size, timed a few times
+(keeping the best) and once under tracemalloc for its peak memory.
+Results are written as JSON, and compared to a previous run with
+--compare. With --corpus, documents dumped by session.py (or saved by
+either editor) replace the synthetic buffers.
+
+    bench.py [-s 1000,10000] [-d density] [-C doc] [-o out] [-c old.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+from contextlib import redirect_stdout
+import ed
+import nano
+from store import RopeStore
+from line import Line
+from document import Document
+
+WORDS = "the quick brown fox jumps over a lazy dog while nobody looks".split()
+
+# ed commands, range placeholders are filled for each buffer size
+ED = {
+    "delete": "{mid},{end}d",
+    "glob": "g/fox/d",
+    "substitute": "1,$s/o/0/",
+    "search": "/needle/",
+    "join": "{mid},{end}j",
+    "printHidden": "1,$P",
+}
+
+# nano keys, applied at the middle of the buffer one at a time (as typed)
+NANO = {
+    "type": list("typing some words ") * 50,
+    "backspace": [nano.BACKSPACE] * 1000,
+    "cut": [nano.CUT] * 100,
+    "paste": list(nano.PASTE_START + "pasting some words\r" * 50 +
+                  nano.PASTE_END),
+}
+# nano operations whose keys arrive in one batch
+BATCHED = {"paste"}
+
+
+def corpus(size, density, seed=0):
+    """size ed lines, density of them with a hidden part, the last
+    one holding the search needle"""
+    rand = random.Random(seed)
+    lines = []
+    for n in range(size):
+        words = rand.sample(WORDS, 6)
+        if rand.random() < density:
+            lines.append([" ".join(words[:3]) + " ", [" ".join(words[3:])]])
+        else:
+            lines.append([" ".join(words)])
+    lines[-1] = ["needle"]
+    return lines
+
+def load(fn):
+    """lines of document fn, followed by the search needle"""
+    with open(fn, encoding="utf-8", newline="") as f:
+        return list(Document.read(f).lines) + [Line("needle")]
+
+def masks(lines):
+    """nano text and masks of ed lines"""
+    text = []
+    vis = []
+    for parts in lines:
+        text.append("")
+        vis.append(bytearray())
+        for part in parts:
+            shown = type(part) == type("")
+            part = part if shown else "".join(part)
+            text[-1] += part
+            vis[-1] += bytearray([shown]) * len(part)
+        text[-1] += "\n"
+        vis[-1] += b"\x01"
+    return text, vis
+
+def edSetup(lines, op):
+    e = ed.editor(store=RopeStore)
+    e.text = lines
+    size = len(lines)
+    comm = ED[op].format(mid=size // 2 + 1, end=min(size, size // 2 + 100))
+    return lambda: e.parse(comm)
+
+def nanoSetup(lines, op):
+    text, vis = masks(lines)
+    e = nano.Engine(text, vis, len(text) // 2)
+    keys = NANO[op]
+    if op in BATCHED:
+        return lambda: e.handleKeys(keys)
+    def run():
+        for key in keys:
+            e.handleKeys([key])
+    return run
+
+def measure(setup, lines, op, repeat):
+    """best seconds and peak traced bytes of op, each on a fresh buffer"""
+    seconds = float("inf")
+    with open(os.devnull, "w") as null, redirect_stdout(null):
+        for n in range(repeat):
+            run = setup(lines, op)
+            start = time.perf_counter()
+            run()
+            seconds = min(seconds, time.perf_counter() - start)
+        run = setup(lines, op)
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, peak
+
+def bench(buffers, ops, repeat=3):
+    """results of ops on each (name, lines) buffer"""
+    results = []
+    for name, lines in buffers:
+        size = len(lines)
+        for editor, setup, table in (("ed", edSetup, ED),
+                                     ("nano", nanoSetup, NANO)):
+            for op in table:
+                if ops and op not in ops:
+                    continue
+                seconds, peak = measure(setup, lines, op, repeat)
+                results.append({"editor": editor, "op": op, "lines": size,
+                                "buffer": name, "seconds": seconds,
+                                "peak": peak})
+                sys.stderr.write("{:5} {:12} {:8} {:10.4f}s {:12}B\n".format(
+                    editor, op, size, seconds, peak))
+    return results
+
+def compare(results, old, threshold):
+    """print ratios to old results, return regressions past threshold"""
+    def key(r):
+        buffer = r.get("buffer", "synthetic")
+        return r["editor"], r["op"], buffer, r["lines"]
+    previous = {key(r): r for r in old["results"]}
+    regressions = 0
+    for r in results:
+        p = previous.get(key(r))
+        if p is None:
+            continue
+        ratio = r["seconds"] / max(p["seconds"], 1e-9)
+        memory = r["peak"] / max(p["peak"], 1)
+        slow = ratio > threshold or memory > threshold
+        regressions += slow
+        sys.stderr.write("{:5} {:12} {:8} time x{:.2f} peak x{:.2f}{}\n"
+                         .format(r["editor"], r["op"], r["lines"], ratio,
+                                 memory, " REGRESSION" if slow else ""))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="time ed and nano hot paths on synthetic buffers")
+    parser.add_argument("-s", "--sizes", default="1000,10000,100000",
+                        help="comma separated buffer sizes, in lines")
+    parser.add_argument("-d", "--density", type=float, default=0.2,
+                        help="fraction of lines with hidden content")
+    parser.add_argument("-C", "--corpus", action="append", default=[],
+                        help="document to use instead of synthetic buffers")
+    parser.add_argument("-p", "--ops", default="",
+                        help="comma separated operations (default all)")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="timed runs per operation, keeping the best")
+    parser.add_argument("-o", "--output", help="write JSON results here")
+    parser.add_argument("-c", "--compare", help="previous JSON results")
+    parser.add_argument("-t", "--threshold", type=float, default=1.25,
+                        help="time or memory ratio reported as regression")
+    args = parser.parse_args()
+    ops = set(filter(None, args.ops.split(",")))
+    if args.corpus:
+        buffers = [(os.path.basename(fn), load(fn)) for fn in args.corpus]
+    else:
+        buffers = [("synthetic", corpus(int(size), args.density))
+                   for size in args.sizes.split(",")]
+    results = {
+        "python": platform.python_version(),
+        "density": args.density,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "repeat": args.repeat,
+        "results": bench(buffers, ops, args.repeat),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+    else:
+        json.dump(results, sys.stdout, indent=1)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if compare(results["results"], old, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
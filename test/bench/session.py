@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""seeded random editing sessions, building up hidden histories
+
+An ed session is a command script (as ed -s runs it), generated against
+a live buffer so addresses stay mostly valid, and edits cluster around
+a drifting spot : lines get substituted, changed, joined and deleted
+again and again, nesting hidden parts. A nano session is a raw key log
+(as nano.py -R replays it) of typing, backspace bursts, moves and cuts.
+
+    session.py [-s seed] [-n steps] [-o dir] [--check]
+
+-o dumps scripts, key logs and resulting documents (see document.py)
+to dir, for bench.py -C ; --check replays each session on the list
+and rope stores (ed), one key at a time and in batches (nano), and
+exits 1 if they differ.
+"""
+
+import io
+import os
+import sys
+import random
+import argparse
+from contextlib import redirect_stdout, redirect_stderr
+import ed
+import nano
+from store import RopeStore
+
+WORDS = ("the quick brown fox jumps over a lazy dog while nobody looks "
+         "at draft words and edits").split()
+PATTERNS = ["o", "the", "qu.ck", "[aeiou]+", "s$", "^a", " ", "fox|dog"]
+ARROWS = ["\x1b[A", "\x1b[B", "\x1b[C", "\x1b[D"]
+
+
+def words(rand, count):
+    return " ".join(rand.choice(WORDS) for n in range(count))
+
+def edCommand(rand, size, focus):
+    """random ed command (with its input lines) for a buffer of size
+    visible lines, around line focus (1 based)"""
+    def span():
+        start = max(1, min(size, focus + rand.randint(-3, 3)))
+        return start, min(size, start + rand.choice([0, 0, 1, 2, 5]))
+    def block():
+        return "".join(words(rand, rand.randint(1, 8)) + "\n"
+                       for n in range(rand.choice([1, 1, 2, 3, 8])))
+    if size == 0:
+        return "a\n" + block() + ".\n"
+    start, end = span()
+    op = rand.choices(["s", "g", "a", "i", "c", "d", "j", "P", "/", "H"],
+                      [40, 4, 16, 6, 8, 6, 5, 5, 5, 5])[0]
+    if op == "s":
+        return "{},{}s/{}/{}/{}\n".format(
+            start, end, rand.choice(PATTERNS), rand.choice(WORDS + [""]),
+            rand.choice(["", "", "g"]))
+    if op == "g":
+        return "g/{}/s/{}/{}/\n".format(rand.choice(WORDS),
+                                        rand.choice(PATTERNS),
+                                        rand.choice(WORDS))
+    if op in "aic":
+        addr = "{},{}".format(start, end) if op == "c" else str(start)
+        return addr + op + "\n" + block() + ".\n"
+    if op == "/":
+        return "/" + rand.choice(PATTERNS) + "/\n"
+    if op == "H":
+        return "H/" + rand.choice(PATTERNS) + "/\n"
+    return "{},{}{}\n".format(start, max(end, start + (op == "j")), op)
+
+def edSession(seed, steps):
+    """script of a random ed session"""
+    rand = random.Random(seed)
+    e = ed.editor(store=list)
+    focus = 1
+    script = []
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        for n in range(steps):
+            size = len(e.text)
+            focus = max(1, min(size, focus + rand.randint(-2, 2)))
+            if rand.random() < 0.05:
+                focus = rand.randint(1, max(1, size))
+            command = edCommand(rand, size, focus)
+            e.run(io.StringIO(command))
+            script.append(command)
+    return "".join(script)
+
+def nanoSession(seed, steps):
+    """raw key log of a random nano session"""
+    rand = random.Random(seed)
+    data = []
+    for n in range(steps):
+        op = rand.choices(["type", "back", "move", "line", "cut", "uncut"],
+                          [50, 20, 15, 8, 4, 3])[0]
+        if op == "type":
+            data.append(words(rand, rand.randint(1, 3)) + " ")
+        elif op == "back":
+            data.append(nano.BACKSPACE * rand.randint(1, 8))
+        elif op == "move":
+            data.append(rand.choice(ARROWS) * rand.randint(1, 6))
+        elif op == "line":
+            data.append("\r")
+        elif op == "cut":
+            data.append(nano.CUT * rand.randint(1, 3))
+        else:
+            data.append(nano.UNCUT)
+    return "".join(data)
+
+def runEd(script, store):
+    """editor after running script on store, and everything it printed"""
+    e = ed.editor(store=store)
+    out = io.StringIO()
+    with redirect_stdout(out), redirect_stderr(out):
+        e.run(io.StringIO(script))
+    return e, out.getvalue()
+
+def runNano(data, batch):
+    """engine after replaying data, in batches or one key at a time"""
+    if batch:
+        return nano.replay(data)[0]
+    e = nano.Engine()
+    for key in nano.keys(data):
+        e.handleKey(key)
+    return e
+
+def check(seed, steps):
+    """differences between backends on sessions of seed"""
+    script = edSession(seed, steps)
+    reference, out = runEd(script, list)
+    e, other = runEd(script, RopeStore)
+    errors = []
+    if out != other:
+        errors.append("ed output differs")
+    if list(e.text) != list(reference.text) or \
+       e.appendix != reference.appendix:
+        errors.append("ed document differs")
+    data = nanoSession(seed, steps)
+    reference = runNano(data, False)
+    e = runNano(data, True)
+    if (e.text, e.vis, e.line, e.char) != \
+       (reference.text, reference.vis, reference.line, reference.char):
+        errors.append("nano state differs")
+    return errors
+
+def dump(seed, steps, directory):
+    """write sessions of seed, and the documents they build, to directory"""
+    def path(name):
+        return os.path.join(directory, name.format(seed))
+    script = edSession(seed, steps)
+    with open(path("ed-{}.ed"), "w") as f:
+        f.write(script)
+    e, out = runEd(script, list)
+    with redirect_stdout(io.StringIO()):
+        e.parse("W " + path("ed-{}.nohide"))
+    data = nanoSession(seed, steps)
+    with open(path("nano-{}.keys"), "w") as f:
+        f.write(data)
+    e = runNano(data, True)
+    e.filename = path("nano-{}.nohide")
+    e.showHidden = True
+    e.save()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="seeded random ed and nano editing sessions")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("-n", "--steps", type=int, default=1000,
+                        help="commands (ed) or key bursts (nano)")
+    parser.add_argument("-k", "--count", type=int, default=1,
+                        help="number of seeds, from seed on")
+    parser.add_argument("-o", "--output", help="dump corpora to directory")
+    parser.add_argument("--check", action="store_true",
+                        help="compare backends on each session")
+    args = parser.parse_args()
+    failed = False
+    for seed in range(args.seed, args.seed + args.count):
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            dump(seed, args.steps, args.output)
+        if args.check:
+            for error in check(seed, args.steps):
+                sys.stderr.write("seed {}: {}\n".format(seed, error))
+                failed = True
+    sys.exit(failed)
+
+if __name__ == "__main__":
+    main()
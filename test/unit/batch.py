@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import unittest
+import ed
+import io
+import contextlib
+
+class TestEdBatch(unittest.TestCase):
+
+    def run_script(self, script):
+        e = ed.editor()
+        out, err = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            status = e.run(io.StringIO(script))
+        return e, status, out.getvalue(), err.getvalue()
+
+    def test_script(self):
+        e, status, out, err = self.run_script("a\nx\ny\n.\n1d\n,p\n")
+        self.assertEqual(status, 0)
+        self.assertEqual(out, "y\n")
+        self.assertEqual(err, "")
+        self.assertEqual(e.text, [[["x\n"], "y"]])
+
+    def test_errors(self):
+        e, status, out, err = self.run_script("a\nx\n.\n5p\nQ\np\n")
+        self.assertEqual(status, 1)
+        self.assertEqual(out, "")
+        self.assertEqual(err, "?4:Invalid address\n")
+
+    def test_invalid_pattern(self):
+        script = "a\nx\n.\n/(/\ns/[/y/\ng/(/d\nH/(/\n,p\n"
+        e, status, out, err = self.run_script(script)
+        self.assertEqual(status, 1)
+        self.assertEqual(out, "x\n")
+        self.assertEqual(err.splitlines(), [
+            "?4:Invalid pattern (missing ), unterminated subpattern)",
+            "?5:Invalid pattern (unterminated character set)",
+            "?6:Invalid pattern (missing ), unterminated subpattern)",
+            "?7:Invalid pattern (missing ), unterminated subpattern)"])
+
+if __name__ == "__main__":
+    unittest.main()
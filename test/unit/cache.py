@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+import unittest
+import ed
+
+class TestEdLineCache(unittest.TestCase):
+
+    def test_offsets(self):
+        cache = ed.LineCache()
+        line = ed.Line.fromParts([["a\n"], "bc", ["d"], "e"])
+        self.assertEqual(cache.visible(line), "bce")
+        self.assertEqual(cache.offsets(line), [0, 0, 2, 2, 3])
+
+    def test_plain_lines(self):
+        e = ed.editor()
+        e.text = [["line {}".format(n)] for n in range(100)] + \
+                 [["a", ["b"], "c"]]
+        e.parse("/line 99/")
+        self.assertEqual(len(e.cache.entries), 0)
+        self.assertEqual(e.cache.offsets(e.text[0]), e.text[0].offsets())
+        self.assertEqual(list(e.printHidden([100])), ["a\033[7mb\033[mc\n"])
+        self.assertEqual(len(e.cache.entries), 1)
+
+    def test_substitute_invalidates(self):
+        e = ed.editor()
+        e.text = [["hello world"], ["bye"]]
+        self.assertEqual(list(e.print([0, 1])), ["hello world\n", "bye\n"])
+        e.parse("2s/bye/ciao/")
+        self.assertEqual(list(e.print([0, 1])), ["hello world\n", "ciao\n"])
+        self.assertEqual(e.cursor, 1)
+
+    def test_join_invalidates(self):
+        e = ed.editor()
+        e.text = [["a"], ["b"]]
+        self.assertEqual(list(e.print([0])), ["a\n"])
+        e.join([0, 1])
+        self.assertEqual(list(e.print([0])), ["ab\n"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+
+import unittest
+from line import Line
+
+class TestLine(unittest.TestCase):
+
+    samples = [
+        ["plain"],
+        [""],
+        [["a\n", "b\n"], "c"],
+        ["he", ["llo"], "goodbye", [" world", "!"], ["x"], ""],
+        [["a\n"], "b", ["c"]],
+    ]
+
+    def test_round_trip(self):
+        for parts in self.samples:
+            line = Line.fromParts(parts)
+            self.assertEqual(line.parts(), parts)
+            self.assertEqual(line, parts)
+            self.assertEqual(repr(line), repr(parts))
+            self.assertEqual(len(line), len(parts))
+
+    def test_plain_line_has_no_spans(self):
+        self.assertIsNone(Line.fromParts(["plain"]).spans)
+
+    def test_renderings(self):
+        line = Line.fromParts(["he", ["llo"], "y", [" a", "b"]])
+        self.assertEqual(line.visible(), "hey")
+        self.assertEqual(line.complete("<"), "he<llo\033[my< ab\033[m")
+        self.assertEqual(line.offsets(), [0, 2, 2, 3, 3])
+
+    def test_prepend(self):
+        line = Line.fromParts([["a\n"], "b"])
+        self.assertEqual(line.prepend(["x\n"]), [["x\n", "a\n"], "b"])
+        line = Line.fromParts([["a"], "b"])
+        self.assertEqual(line.prepend(["x\n"]), [["x\n"], ["a"], "b"])
+
+    def test_join(self):
+        line = Line.fromParts(["a", ["b"]])
+        joined = line.join([Line.fromParts([["c"], "d"]), Line("e")])
+        self.assertEqual(joined, ["a", ["b", "c"], "d", "e"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+import unittest
+import ed
+
+class TestEdDelete(unittest.TestCase):
+
+    def test_range_delete_middle(self):
+        e = ed.editor()
+        e.text = [["a"], [["x\n"], "b"], ["c"], ["d"]]
+        e.delete([0, 2])
+        self.assertEqual(e.text, [[["a\n", "x\n", "b\n", "c\n"], "d"]])
+        self.assertEqual(e.appendix, [])
+        self.assertEqual(e.cursor, 0)
+
+    def test_range_delete_end(self):
+        e = ed.editor()
+        e.text = [["a"], ["b", ["c"], "d"], ["e"]]
+        e.appendix = ["f\n"]
+        e.delete([1, 2])
+        self.assertEqual(e.text, [["a"]])
+        self.assertEqual(e.appendix, ["bcd\n", "e\n", "f\n"])
+        self.assertEqual(e.cursor, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import unittest
+import ed
+import store
+import os
+import tempfile
+import contextlib
+import io
+
+class TestEdFiles(unittest.TestCase):
+
+    def setUp(self):
+        store.CHUNKBYTES = 16 # Map file in many chunks
+        self.dir = tempfile.TemporaryDirectory()
+        self.fn = os.path.join(self.dir.name, "text")
+        self.create()
+
+    def create(self):
+        with open(self.fn, "w") as f:
+            f.write("".join("line {}\n".format(n) for n in range(100)))
+
+    def tearDown(self):
+        store.CHUNKBYTES = 1 << 16
+        self.dir.cleanup()
+
+    def parse(self, e, comm):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            e.parse(comm)
+        return out.getvalue()
+
+    def test_edit_is_lazy(self):
+        e = ed.editor()
+        self.assertEqual(self.parse(e, "e " + self.fn), "790\n")
+        self.assertEqual(len(e.text), 100)
+        self.assertEqual(e.cursor, 99)
+        self.assertEqual(self.parse(e, "51p"), "line 50\n")
+        loaded = [chunk for chunk in e.text.chunks if type(chunk) is list]
+        self.assertEqual(len(loaded), 1)
+
+    def test_write_visible_text(self):
+        for backend in (store.RopeStore, list):
+            self.create()
+            e = ed.editor(store=backend)
+            self.parse(e, "e " + self.fn)
+            self.parse(e, "2,99d")
+            self.assertEqual(self.parse(e, "w"), "15\n")
+            self.assertFalse(e.modified)
+            with open(self.fn) as f:
+                self.assertEqual(f.read(), "line 0\nline 99\n")
+            self.parse(e, "e")
+            self.assertEqual(e.text, [["line 0"], ["line 99"]])
+            self.assertEqual(e.appendix, [])
+
+    def test_not_utf8(self):
+        with open(self.fn, "wb") as f:
+            f.write(b"line 0\n" * 10 + "caf\xe9\n".encode("latin-1"))
+        for backend in (store.RopeStore, list):
+            e = ed.editor(store=backend)
+            e.text = [["kept"]]
+            with self.assertRaises(ed.EdError):
+                e.parse("e " + self.fn)
+            self.assertEqual(e.text, [["kept"]])
+
+    def test_script_is_silent(self):
+        e = ed.editor()
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            e.run(io.StringIO("e {}\n1p\nw\n".format(self.fn)))
+        self.assertEqual(out.getvalue(), "line 0\n")
+
+if __name__ == "__main__":
+    unittest.main()
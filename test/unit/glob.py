@@ -2,6 +2,8 @@
 
 import unittest
 import ed
+import random
+from marks import MarkIndex
 
 class TestEdGlob(unittest.TestCase):
 
@@ -12,5 +14,42 @@ class TestEdGlob(unittest.TestCase):
         self.assertEqual(e.text, [[["a\n"], "b"]])
         self.assertEqual(e.appendix, ["a\n"])
 
+    def test_inner_lines_delete(self):
+        e = ed.editor()
+        e.text = [["b"], ["a"], ["a"], ["b"], ["a"], ["b"]]
+        e.parse("g/a/d")
+        self.assertEqual(e.text, [["b"], [["a\n", "a\n"], "b"], [["a\n"], "b"]])
+        self.assertEqual(e.appendix, [])
+
+    def test_substitute_relative(self):
+        e = ed.editor()
+        e.text = [["a"], ["b"], ["a"], ["b"]]
+        e.parse("g/a/+1s/b/c/")
+        self.assertEqual(e.text, [["a"], [["b"], "c"], ["a"], [["b"], "c"]])
+
+    def test_compiled_command(self):
+        e = ed.editor()
+        e.text = [["a"], ["b"], ["c"]]
+        command = e.compile("1d")
+        e.execute(command)
+        e.execute(command)
+        self.assertEqual(e.text, [[["a\n", "b\n"], "c"]])
+
+    def test_mark_index(self):
+        lines = sorted(random.sample(range(1000), 100))
+        marks = MarkIndex(lines)
+        for test in range(50):
+            start = random.randrange(1000)
+            end = start + random.randrange(5)
+            inc = random.choice([start - end - 1, 0, random.randrange(5)])
+            # Reference : list based updateMarks
+            lines = [i + inc if i > end else i for i in lines
+                     if not start <= i <= end]
+            marks.update([start, end], inc)
+            self.assertEqual(len(marks), len(lines))
+            if test % 10 == 0:
+                self.assertEqual(marks.pop(), lines.pop(0))
+        self.assertEqual([marks.pop() for i in lines], lines)
+
 if __name__ == "__main__":
     unittest.main()
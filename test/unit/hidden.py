@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+from contextlib import redirect_stdout
+import ed
+
+class TestEdHiddenSearch(unittest.TestCase):
+
+    def setUp(self):
+        ed.INDEXSCANS = 1 # Build indexes on first search
+
+    def tearDown(self):
+        ed.INDEXSCANS = 8
+
+    def run_hidden(self, e, comm):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            e.parse(comm)
+        return out.getvalue()
+
+    def test_parts_and_appendix(self):
+        e = ed.editor("<")
+        e.text = [["one"], ["two"], ["three"], ["four"]]
+        self.run_hidden(e, "2s/two/deux/")
+        e.parse("1d")
+        e.parse("$d")
+        out = self.run_hidden(e, "H/o/")
+        self.assertEqual(out, "1:1\t<one\\n\033[m\n"
+                              "1:2\t<two\033[m\n"
+                              "$+1\t<four\\n\033[m\n")
+        self.assertEqual(e.cursor, 0)
+        e.cursor = 1
+        self.assertEqual(self.run_hidden(e, "1H/tw/"), "1:2\t<two\033[m\n")
+        self.assertEqual(e.cursor, 0)
+        with self.assertRaises(ed.EdError):
+            e.parse("H/three/")
+
+    def test_indexed(self):
+        e = ed.editor("<")
+        e.text = [["line {}".format(n)] for n in range(5000)]
+        e.parse("101,200d")
+        e.parse("$d")
+        out = self.run_hidden(e, "H/line 150/")
+        self.assertIsNotNone(e.hiddenIndex)
+        self.assertTrue(out.startswith("101:1\t<line 100\\n"))
+        e.parse("1d")
+        self.assertEqual(self.run_hidden(e, "H/line 0/"), "1:1\t<line 0\\n\033[m\n")
+        e.parse("$d")
+        self.assertEqual(self.run_hidden(e, "H/line 499[89]/"),
+                         "$+1\t<line 4998\\n\033[m\n$+2\t<line 4999\\n\033[m\n")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+import io
+import os
+import json
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+import ed
+import stats
+
+class TestEdInstrument(unittest.TestCase):
+
+    def parse(self, e, comm):
+        with redirect_stdout(io.StringIO()) as out:
+            e.parse(comm)
+        return out.getvalue()
+
+    def test_off(self):
+        e = ed.editor()
+        e.text = [["one"], ["two"]]
+        with self.assertRaises(ed.EdError):
+            e.parse("T")
+
+    def test_commands(self):
+        e = ed.editor()
+        e.text = [["one"], ["two"], ["three"]]
+        e.instrument(memory=False)
+        self.parse(e, "1p")
+        self.parse(e, "g/o/s/o/0/")
+        with self.assertRaises(ed.EdError):
+            e.parse("1s/x/y/")
+        figures = e.stats.summary()
+        self.assertEqual(sorted(figures), ["g", "p", "s"])
+        self.assertEqual(figures["s"]["count"], 3)
+        self.assertEqual(figures["s"]["lines"], 2)
+        self.assertEqual(figures["g"]["lines"], 2)
+        self.assertEqual(figures["p"]["lines"], 0)
+        self.assertLessEqual(figures["s"]["p50"], figures["s"]["max"])
+        report = self.parse(e, "T").splitlines()
+        self.assertEqual(report[0].split()[0], "cmd")
+        self.assertEqual([line.split()[0] for line in report[1:]],
+                         ["g", "p", "s"])
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, "stats.json")
+            e.stats.dump(fn)
+            with open(fn) as f:
+                self.assertEqual(json.load(f)["s"]["count"], 3)
+
+    def test_percentile(self):
+        times = [n / 100 for n in range(1, 101)]
+        self.assertEqual(stats.percentile(times, 50), 0.5)
+        self.assertEqual(stats.percentile(times, 99), 0.99)
+        self.assertEqual(stats.percentile([1.0], 90), 1.0)
+
+if __name__ == "__main__":
+    unittest.main()
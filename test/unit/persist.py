@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import unittest
+import ed
+import journal
+import os
+import tempfile
+import contextlib
+import io
+
+class TestEdJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.fn = os.path.join(self.dir.name, "journal")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def session(self, script):
+        e = ed.editor()
+        e.persist(self.fn)
+        with contextlib.redirect_stdout(io.StringIO()):
+            e.run(io.StringIO(script))
+        e.journal.close()
+        return e
+
+    def reopen(self):
+        e = ed.editor()
+        e.persist(self.fn)
+        e.journal.close()
+        return e
+
+    def test_reopen(self):
+        e = self.session("a\nhello\nworld\n.\ns/world/you/\n1d\n$a\nend\n.\n$d\n")
+        f = self.reopen()
+        self.assertEqual(f.text, e.text)
+        self.assertEqual(f.appendix, e.appendix)
+        self.assertEqual(f.text, [[["hello\n"], ["world"], "you"]])
+        self.assertEqual(f.appendix, ["end\n"])
+
+    def test_checkpoints(self):
+        journal.CHECKPOINT = 2
+        try:
+            e = self.session("a\na\nb\nc\n.\n2d\n1,2j\ns/c/d/\n")
+        finally:
+            journal.CHECKPOINT = 1000
+        with open(self.fn) as f:
+            records = f.read()
+        # compacted to the last checkpoint, and the records after it
+        self.assertTrue(records.startswith("C "))
+        self.assertEqual(records.count("\nC "), 0)
+        self.assertFalse(os.path.exists(self.fn + ".tmp"))
+        self.assertEqual(self.reopen().text, e.text)
+
+    def test_interrupted_record(self):
+        e = self.session("a\na\nb\n.\n")
+        with open(self.fn, "a") as f:
+            f.write('S [0,1,[["interru')
+        self.assertEqual(self.reopen().text, e.text)
+        e = self.session("1d\n")
+        self.assertEqual(self.reopen().text, [[["a\n"], "b"]])
+
+    def test_checkpoint_then_delete(self):
+        journal.CHECKPOINT = 2
+        try:
+            e = self.session("a\na\nb\nc\nd\ne\n.\n2d\n3d\n1,2j\n2d\n")
+            with open(self.fn) as f:
+                records = f.read()
+            self.assertTrue(records.startswith("C "))
+            f = self.reopen()
+        finally:
+            journal.CHECKPOINT = 1000
+        self.assertEqual((f.text, f.appendix), (e.text, e.appendix))
+        self.assertEqual(len(f.text), 1)
+
+    def test_interrupted_checkpoint(self):
+        e = self.session("a\na\nb\nc\n.\n2d\n")
+        with open(self.fn, "a") as f:
+            f.write('C 2 []\nL ["a"]\n')
+        f = self.reopen()
+        self.assertEqual(f.text, e.text)
+        g = self.session("1d\n")
+        with open(self.fn) as f:
+            self.assertNotIn('L ["a"]\nS', f.read())
+        self.assertEqual(self.reopen().text, g.text)
+        self.assertEqual(g.text, [[["a\n", "b\n"], "c"]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import io
+import json
+import random
+import unittest
+import nano
+
+def visible(e):
+    return [e.getVisible(n) for n in range(len(e.text))]
+
+class TestNanoReplay(unittest.TestCase):
+
+    def test_keys(self):
+        self.assertEqual(list(nano.keys("a\x1b[B\r\x7f")),
+                         ["a", "KEY_DOWN", "\n", "\x7f"])
+
+    def test_typing(self):
+        e, count = nano.replay("hello wor\x7f\x7f\x7fworld\rbye")
+        self.assertEqual(count, 21)
+        self.assertEqual(visible(e), ["hello world\n", "bye\n"])
+        self.assertEqual(e.text, ["hello worworld\n", "bye\n"])
+        self.assertEqual((e.line, e.char), (1, 3))
+
+    def test_masks(self):
+        e, count = nano.replay("ab\x7fc\rd")
+        self.assertEqual(e.vis, [bytearray(b"\x01\x00\x01\x01"),
+                                 bytearray(b"\x01\x01")])
+        data = nano.encodeLine((e.text[0], e.vis[0]))
+        self.assertEqual(data, ["abc\n", [1, 1, 2]])
+        self.assertEqual(nano.decodeLine(data), (e.text[0], e.vis[0]))
+
+    def test_gap(self):
+        e, count = nano.replay("ab\rxyz\x7f\x7fw")
+        self.assertIsNotNone(e.gap)
+        self.assertEqual(visible(e), ["ab\n", "xw\n"])
+        self.assertIsNone(e.gap)
+        self.assertEqual(e.vis[1], bytearray(b"\x01\x00\x00\x01\x01"))
+        self.assertEqual((e.char, e.dispchar), (4, 2))
+
+    def test_gap_closed(self):
+        # typing into a gap, or into closed lines, gives the same results
+        class Closed(nano.Engine):
+            def type(self, c):
+                super().type(c)
+                self.flush()
+        keys = "ab\r\x7f\x16\x0b\x15" + "x" * 5 + "\x7f" * 3
+        keys = list(keys) + ["KEY_LEFT", "KEY_RIGHT", "KEY_UP", "KEY_DOWN"]
+        rand = random.Random(0)
+        for n in range(20):
+            a, b = nano.Engine(), Closed()
+            for key in [rand.choice(keys) for m in range(200)]:
+                a.handleKey(key)
+                b.handleKey(key)
+                self.assertEqual((a.line, a.char, a.dispchar),
+                                 (b.line, b.char, b.dispchar))
+            self.assertEqual((a.text, a.vis), (b.text, b.vis))
+
+    def test_vis_counts(self):
+        rand = random.Random(0)
+        mask = bytearray(rand.choice(b"\x00\x01") for n in range(100))
+        counts = nano.VisCounts(mask)
+        for n in range(50):
+            counts.hide(rand.randrange(100))
+            i = rand.randrange(101)
+            self.assertEqual(counts.before(i), sum(mask[:i]))
+            shown = [n for n, v in enumerate(mask) if v]
+            self.assertEqual(counts.total, len(shown))
+            for k in range(0, len(shown), 7):
+                self.assertEqual(counts.select(k), shown[k])
+
+    def test_vertical_column(self):
+        # moving up keeps the visible column, across hidden characters
+        e = nano.Engine(["axxbcd\n", "abcdef\n"],
+                        [bytearray(b"\x01\x00\x00\x01\x01\x01\x01"),
+                         nano.mask("abcdef\n")], line=1, char=3)
+        e.handleKey("KEY_UP")
+        self.assertEqual((e.line, e.char, e.dispchar), (0, 5, 3))
+
+    def test_paste(self):
+        e, count = nano.replay("ab\x1b[200~one\rtwo\x1b[201~c\x7f!")
+        self.assertEqual(visible(e), ["abone\n", "two!\n"])
+        self.assertEqual((e.line, e.char, e.dispchar), (1, 5, 4))
+
+    def test_split_paste(self):
+        # a paste, and its markers, split across batches at every point
+        data = "x\x1b[200~hello\r\nwor\x1b[xld\x1b[201~!"
+        whole = nano.Engine()
+        whole.handleKeys(list(data))
+        self.assertEqual(visible(whole), ["xhello\n", "wor\x1b[xld!\n"])
+        for n in range(len(data)):
+            for m in range(n, len(data)):
+                e = nano.Engine()
+                for batch in (data[:n], data[n:m], data[m:]):
+                    e.handleKeys(list(batch))
+                self.assertEqual((e.text, e.pasting), (whole.text, False),
+                                 (n, m))
+
+    def test_batch(self):
+        # keys applied in batches, or one at a time, give the same results
+        keys = "ab\r\x7f\x16\x0b\x15" + "x" * 5 + "\x7f" * 3
+        keys = list(keys) + ["KEY_LEFT", "KEY_RIGHT", "KEY_UP", "KEY_DOWN"]
+        rand = random.Random(1)
+        for n in range(20):
+            a, b = nano.Engine(), nano.Engine()
+            pressed = [rand.choice(keys) for m in range(200)]
+            for m in range(0, len(pressed), 10):
+                a.handleKeys(pressed[m:m+10])
+            for key in pressed:
+                b.handleKey(key)
+            self.assertEqual((a.line, a.char, a.dispchar),
+                             (b.line, b.char, b.dispchar))
+            self.assertEqual((a.text, a.vis), (b.text, b.vis))
+
+    def test_cut_uncut(self):
+        e, count = nano.replay("one\rtwo\x1b[A\x0b\x15\x15")
+        self.assertEqual(visible(e), ["one\n", "one\n", "two\n"])
+
+    def test_exit(self):
+        e, count = nano.replay("ab\x18cd")
+        self.assertEqual(count, 3)
+        self.assertEqual(visible(e), ["ab\n"])
+
+    def test_cast(self):
+        cast = io.StringIO("\n".join([
+            json.dumps({"version": 2, "width": 80, "height": 24}),
+            json.dumps([0.1, "i", "hi"]),
+            json.dumps([0.2, "o", "hi"]),
+            json.dumps([0.3, "i", "\r!"]),
+        ]))
+        e, count = nano.replay("".join(nano.castInput(cast)))
+        self.assertEqual(visible(e), ["hi\n", "!\n"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+import unittest
+import store
+import random
+
+class TestRopeStore(unittest.TestCase):
+
+    def setUp(self):
+        store.CHUNK = 4 # Exercise chunk splits and merges
+
+    def tearDown(self):
+        store.CHUNK = 512
+
+    def test_indexing(self):
+        lines = [[str(n)] for n in range(50)]
+        s = store.RopeStore(lines)
+        self.assertEqual(len(s), 50)
+        self.assertEqual(s, lines)
+        for n in range(-50, 50):
+            self.assertEqual(s[n], lines[n])
+        self.assertEqual(s[7:31], lines[7:31])
+        self.assertEqual(repr(s), repr(lines))
+
+    def test_random_splices(self):
+        lines = []
+        s = store.RopeStore()
+        for test in range(500):
+            start = random.randrange(len(lines) + 1)
+            stop  = random.randrange(start, min(len(lines), start + 20) + 1)
+            new = [[str(test)]] * random.randrange(12)
+            lines[start:stop] = new
+            s[start:stop] = new
+            self.assertEqual(s, lines)
+        for n in range(len(lines)):
+            self.assertEqual(s[n], lines[n])
+
+    def test_list_methods(self):
+        s = store.RopeStore()
+        s.append(["b"])
+        s.insert(0, ["a"])
+        s.extend([["c"], ["d"]])
+        del s[1]
+        s[-1] = ["e"]
+        self.assertEqual(s, [["a"], ["c"], ["e"]])
+
+if __name__ == "__main__":
+    unittest.main()
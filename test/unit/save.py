@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+import nano
+
+class TestNanoSave(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.fn = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.fn)
+
+    def test_fulltext(self):
+        e, count = nano.replay("héllo\r\x7f\x7fwörld\rbye\x7f\x7f")
+        e.filename = self.fn
+        e.showHidden = True
+        e.save()
+        with open(self.fn, encoding="utf-8") as f:
+            self.assertEqual(f.readline(), nano.MAGIC)
+        f = nano.Engine()
+        f.load(self.fn)
+        self.assertEqual((f.text, f.vis), (e.text, e.vis))
+        self.assertEqual(f.getVisible(0), "héllwörld\n")
+
+    def test_plaintext(self):
+        with open(self.fn, "w") as f:
+            f.write("one\ntwo")
+        e = nano.Engine()
+        e.load(self.fn)
+        self.assertEqual(e.text, ["one\n", "two\n"])
+        e.handleKeys(list("!"))
+        e.save()
+        with open(self.fn) as f:
+            self.assertEqual(f.read(), "!one\ntwo\n")
+
+    def test_missing(self):
+        e = nano.Engine()
+        e.load(self.fn + ".new")
+        self.assertEqual((e.text, e.filename), (["\n"], self.fn + ".new"))
+
+    def test_unreadable(self):
+        for data in ["caf\xe9\n".encode("latin-1"),
+                     (nano.MAGIC + "\x00\n").encode("utf-8")]:
+            with open(self.fn, "wb") as f:
+                f.write(data)
+            e = nano.Engine()
+            e.load(self.fn)
+            self.assertEqual((e.text, e.filename), (["\n"], False))
+            self.assertIn(self.fn, e.message)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import unittest
+import nano
+
+class FakeScreen:
+    """character grid standing for a curses window"""
+
+    def __init__(self, height=10, width=20):
+        self.height, self.width = height, width
+        self.rows = [[" "] * width for n in range(height)]
+        self.attrs = [[0] * width for n in range(height)]
+        self.calls = 0 # Drawing calls
+        self.y = self.x = 0
+        self.region = (0, height - 1)
+        self.clears = 0
+        self.cleared = [] # Rows cleared by clrtoeol
+
+    def getmaxyx(self):
+        return self.height, self.width
+
+    def move(self, y, x):
+        assert 0 <= y < self.height and 0 <= x < self.width, (y, x)
+        self.y, self.x = y, x
+
+    def clear(self):
+        self.clears += 1
+        self.rows = [[" "] * self.width for n in range(self.height)]
+
+    def clrtoeol(self):
+        self.cleared.append(self.y)
+        self.rows[self.y][self.x:] = [" "] * (self.width - self.x)
+
+    def addch(self, y, x, c):
+        self.calls += 1
+        self.move(y, x)
+        self.rows[y][x] = c
+
+    def addstr(self, *args):
+        self.calls += 1
+        if len(args) > 2 or type(args[0]) is int:
+            self.move(args[0], args[1])
+            args = args[2:]
+        attr = args[1] if len(args) > 1 else 0
+        for c in args[0][:self.width - self.x]:
+            self.rows[self.y][self.x] = c
+            self.attrs[self.y][self.x] = attr
+            self.x += 1
+
+    def attron(self, attr): pass
+    def attroff(self, attr): pass
+    def chgat(self, *args): pass
+    def scrollok(self, flag): pass
+    def idlok(self, flag): pass
+    def refresh(self): pass
+
+    def setscrreg(self, top, bottom):
+        self.region = (top, bottom)
+
+    def scroll(self, n):
+        top, bottom = self.region
+        rows = self.rows[top:bottom+1]
+        blank = [[" "] * self.width for m in range(abs(n))]
+        rows = rows[n:] + blank if n > 0 else blank + rows[:n]
+        self.rows[top:bottom+1] = rows
+
+    def row(self, y):
+        return "".join(self.rows[y]).rstrip()
+
+def text(e):
+    """text rows of screen"""
+    return [e.stdscr.row(y) for y in range(nano.VOFF, nano.VOFF + e.rows())]
+
+def press(e, *keys):
+    for key in keys:
+        e.handleKey(key)
+        e.refresh()
+
+class TestNanoScreen(unittest.TestCase):
+
+    def editor(self, lines, height=10, width=20):
+        e = nano.Editor(FakeScreen(height, width),
+                        [line + "\n" for line in lines])
+        e.display()
+        e.refresh()
+        return e
+
+    def test_viewport(self):
+        e = self.editor(["line {}".format(n) for n in range(100)])
+        self.assertEqual(e.rows(), 5)
+        self.assertEqual(text(e), ["line {}".format(n) for n in range(5)])
+        press(e, *["KEY_DOWN"] * 7)
+        self.assertEqual(e.top, 3)
+        self.assertEqual(text(e), ["line {}".format(n) for n in range(3, 8)])
+        self.assertEqual(e.stdscr.clears, 1)
+        e.setLine(50)
+        e.refresh()
+        self.assertEqual(text(e), ["line {}".format(n) for n in range(46, 51)])
+        press(e, "KEY_UP")
+        e.setLine(45)
+        e.refresh()
+        self.assertEqual(text(e), ["line {}".format(n) for n in range(45, 50)])
+        self.assertEqual((e.stdscr.y, e.stdscr.x), (nano.VOFF, 0))
+
+    def test_horizontal(self):
+        e = self.editor(["abcdefghijklmnopqrstuvwxyz", "x"])
+        self.assertEqual(text(e)[0], "abcdefghijklmnopqrst")
+        press(e, *["KEY_RIGHT"] * 22)
+        self.assertEqual(e.left, 10)
+        self.assertEqual(text(e)[:2], ["klmnopqrstuvwxyz", ""])
+        self.assertEqual(e.stdscr.x, 12)
+
+    def test_damage(self):
+        e = self.editor(["one", "two", "three"])
+        e.stdscr.cleared = []
+        press(e, "KEY_DOWN", "!")
+        self.assertEqual(e.stdscr.cleared, [nano.VOFF + 1])
+        self.assertEqual(text(e)[:3], ["one", "!two", "three"])
+        e.stdscr.cleared = []
+        press(e, "\x0b")
+        self.assertEqual(e.stdscr.cleared, list(range(nano.VOFF + 1,
+                                                      nano.VOFF + e.rows())))
+        self.assertEqual(text(e)[:3], ["one", "three", ""])
+        self.assertEqual(e.stdscr.clears, 1)
+
+    def test_runs(self):
+        e = nano.Editor(FakeScreen(), ["ab\ncdefghijklmnopqrstuvwxyz\n"],
+                        [bytearray(b"\x00\x01\x00\x00\x01") +
+                         nano.mask("efghijklmnopqrstuvwxyz\n")])
+        e.hiddenAttr = lambda: 2
+        e.display()
+        press(e, "\x16")
+        self.assertEqual(text(e)[:2], ["ab↵cdefghijklmnopqrs", ""])
+        self.assertEqual(e.stdscr.attrs[nano.VOFF][:6], [2, 0, 2, 2, 0, 0])
+        e.stdscr.calls = 0
+        press(e, "\x16")
+        self.assertEqual(text(e)[:2], ["bdefghijklmnopqrstuv", ""])
+        self.assertEqual(e.stdscr.calls, 1)
+
+    def test_message(self):
+        e = self.editor(["one"], width=40)
+        e.message = "Cannot open file"
+        e.bars = True
+        e.refresh()
+        self.assertEqual(e.stdscr.row(7).strip(), "[ Cannot open file ]")
+        e.handleKeys(["x"])
+        e.refresh()
+        self.assertEqual(e.stdscr.row(7), "")
+
+if __name__ == "__main__":
+    unittest.main()
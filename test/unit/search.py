@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+from contextlib import redirect_stdout
+import ed
+import index
+
+class TestEdSearch(unittest.TestCase):
+
+    def setUp(self):
+        ed.INDEXSCANS = 1 # Build indexes on first search
+
+    def tearDown(self):
+        ed.INDEXSCANS = 8
+
+    def test_literals(self):
+        self.assertEqual(index.literals("hel+o world"), ["hel", "o world"])
+        self.assertEqual(index.literals("abc*def"), ["def"])
+        self.assertEqual(index.literals("a(bcd)?e"), [])
+        self.assertEqual(index.literals("foo|bar"), [])
+        self.assertEqual(index.literals("\\x41bcd"), ["bcd"])
+        self.assertEqual(index.literals("\\101bcd"), ["bcd"])
+        self.assertEqual(index.literals("\\u0041bc\\U00000041xyz"),
+                         ["xyz"])
+        self.assertEqual(index.literals("\\N{LATIN SMALL LETTER A}bc"), [])
+        self.assertEqual(index.literals("(ab)\\1abcd"), ["abcd"])
+        self.assertEqual(index.literals("a\\.bcd"), ["a.bcd"])
+
+    def test_search_wraps(self):
+        e = ed.editor()
+        e.text = [["foo"], ["bar"], ["foo"]]
+        e.cursor = 1
+        self.assertEqual(e.search(e.compileSearch("/foo/")[0]), 2)
+        e.cursor = 0
+        self.assertEqual(e.search(e.compileSearch("/foo/")[0]), 0)
+
+    def test_indexed(self):
+        e = ed.editor()
+        e.text = [["line {}".format(n)] for n in range(ed.INDEXLINES)]
+        search = lambda s: e.search(e.compileSearch(s)[0])
+        e.cursor = 10
+        self.assertEqual(search("/line 4000/"), 4000)
+        self.assertIsNotNone(e.index)
+        e.parse("4001s/4000/ciao/")
+        self.assertEqual(search("/line ciao/"), 4000)
+        e.parse("1d")
+        e.cursor = 0
+        self.assertEqual(search("/line ciao/"), 3999)
+        e.parse("g/line 1/d")
+        self.assertEqual(e.text[0].visible(), "line 2")
+        with self.assertRaises(ed.EdError):
+            search("/line 1/")
+
+    def test_stale_index(self):
+        e = ed.editor()
+        e.text = [["line {}".format(n)] for n in range(ed.INDEXLINES)]
+        e.cursor = 0
+        self.assertEqual(e.search(e.compileSearch("/line 3000/")[0]), 3000)
+        index = e.index
+        with redirect_stdout(io.StringIO()):
+            e.parse("1,3000s/line/row/")
+        self.assertEqual(e.search(e.compileSearch("/row 2999/")[0]), 2999)
+        self.assertIsNot(e.index, index)
+        self.assertEqual(e.index.stale, 0)
+        with self.assertRaises(ed.EdError):
+            e.search(e.compileSearch("/line 2999/")[0])
+
+    def test_escaped_code(self):
+        e = ed.editor()
+        e.text = [["line {}".format(n)] for n in range(ed.INDEXLINES)]
+        e.parse("$s/$/ Abcd/")
+        e.cursor = 0
+        self.assertEqual(e.search(e.compileSearch("/\\x41bcd/")[0]),
+                         ed.INDEXLINES - 1)
+        self.assertIsNotNone(e.index)
+        self.assertEqual(e.search(e.compileSearch("/\\101bcd/")[0]),
+                         ed.INDEXLINES - 1)
+
+    def test_empty_buffer(self):
+        for store in (ed.RopeStore, list):
+            e = ed.editor(store=store)
+            e.run(io.StringIO("a\nx\n.\n,d\n"))
+            for search in ("/x/", "?x?"):
+                with self.assertRaises(ed.EdError):
+                    e.parse(search)
+
+    def test_previous_pattern(self):
+        e = ed.editor()
+        e.text = [["one"], ["two"], ["three"], ["two"]]
+        with self.assertRaises(ed.EdError):
+            e.parse("//")
+        with self.assertRaises(ed.EdError):
+            e.parse("s")
+        with redirect_stdout(io.StringIO()):
+            e.parse("/tw/")
+            self.assertEqual(e.cursor, 1)
+            e.cursor = 2
+            e.parse("//")
+            self.assertEqual(e.cursor, 3)
+            e.parse("s//TW/")
+            e.parse("1s/e/E/")
+            e.parse("3s")
+            e.parse("g/o/s//0/")
+        self.assertEqual([line.visible() for line in e.text],
+                         ["0nE", "tw0", "thrEe", "TW0"])
+        self.assertIs(e.compileSearch("/o/")[0], ed.pattern("o"))
+        e.lastPattern = None
+        e.compileSubstitute("s/e/E/")
+        self.assertIs(e.lastPattern, ed.pattern("e"))
+
+    def test_pattern_error_context(self):
+        e = ed.editor()
+        with self.assertRaises(ed.EdError) as caught:
+            e.compileSubstitute("s/[/x/")
+        context = caught.exception.__context__
+        self.assertIsInstance(context, ed.re.error)
+        self.assertIsNone(context.__context__)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bench"))
+import session
+
+class TestSessions(unittest.TestCase):
+
+    def test_seeded(self):
+        self.assertEqual(session.edSession(3, 50), session.edSession(3, 50))
+        self.assertEqual(session.nanoSession(3, 50),
+                         session.nanoSession(3, 50))
+
+    def test_hidden_history(self):
+        e, out = session.runEd(session.edSession(1, 300), list)
+        self.assertGreater(max(len(line.hidden()) for line in e.text), 2)
+
+    def test_backends_agree(self):
+        for seed in range(4):
+            self.assertEqual(session.check(seed, 200), [], seed)
+
+if __name__ == "__main__":
+    unittest.main()
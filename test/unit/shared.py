@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import os
+import io
+import tempfile
+import unittest
+import contextlib
+import ed
+import nano
+from line import Line
+
+class TestSharedDocument(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.fn = os.path.join(self.dir.name, "doc")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def parse(self, e, comm):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            e.parse(comm)
+        return out.getvalue()
+
+    def test_hidden_lines_roundtrip(self):
+        # only complete lines hidden at line start are hidden lines
+        e = ed.editor()
+        e.text = [["a"], ["bcx"], ["z"]]
+        self.parse(e, "1d")
+        self.parse(e, "1s/bc//")
+        self.parse(e, "W " + self.fn)
+        self.parse(e, "e " + self.fn)
+        self.assertEqual(e.text, [[["a\n"], ["bc"], "x"], ["z"]])
+        self.parse(e, "1d")
+        self.assertEqual(e.text, [[["a\n", "bcx\n"], "z"]])
+
+    def test_mask(self):
+        line = Line.fromParts(["a", ["old\n", "b"], "c"])
+        self.assertEqual(line.mask(), bytearray(b"\x01\x00\x00\x00\x00\x00\x01"))
+        self.assertEqual(Line.fromMask(line.text, line.mask()), line)
+        self.assertIsNone(Line.fromMask("abc", b"\x01\x01\x01").spans)
+        line = Line.fromMask("a\nb\ncx", bytearray(b"\x00" * 5 + b"\x01"))
+        self.assertEqual(line, [["a\n", "b\n"], ["c"], "x"])
+
+    def test_ed_to_nano(self):
+        e = ed.editor()
+        e.text = [["one"], ["two"], ["three"]]
+        self.parse(e, "2s/w/W/")
+        self.parse(e, "$d")
+        self.parse(e, "W " + self.fn)
+        n = nano.Engine()
+        n.load(self.fn)
+        self.assertEqual(n.getVisible(0), "one\n")
+        self.assertEqual(n.getVisible(1), "tWo\n")
+        self.assertEqual(n.text[1], "twWothree\n\n")
+        f = ed.editor()
+        self.parse(f, "e " + self.fn)
+        # adjacent visible parts are saved as one
+        self.assertEqual(f.text, [["one"], ["t", ["w"], "Wo"]])
+        self.assertEqual(f.appendix, e.appendix)
+
+    def test_nano_to_ed(self):
+        n, count = nano.replay("one\rtwox\x7f\rthree")
+        n.filename = self.fn
+        n.showHidden = True
+        n.save()
+        e = ed.editor()
+        self.assertEqual(self.parse(e, "e " + self.fn),
+                         "{}\n".format(os.path.getsize(self.fn)))
+        self.assertEqual(e.text, [["one"], ["two", ["x"]], ["three"]])
+        self.parse(e, "1s/one/1/")
+        self.parse(e, "W")
+        n = nano.Engine()
+        n.load(self.fn)
+        self.assertEqual(n.text, ["one1\n", "twox\n", "three\n"])
+        self.assertEqual(n.getVisible(0), "1\n")
+        self.assertEqual(n.getVisible(1), "two\n")
+
+if __name__ == "__main__":
+    unittest.main()